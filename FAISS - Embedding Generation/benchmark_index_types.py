@@ -0,0 +1,148 @@
+"""
+Recall/latency/size benchmark of the FAISS index types in vector_index.py.
+
+Uses the vectors of an existing index directory (or a synthetic clustered corpus) as the base set,
+builds each candidate index, and compares its top-k results with an exhaustive flat search:
+    python benchmark_index_types.py --index-dir ../pages/faiss_indexes/2024/English
+    python benchmark_index_types.py --synthetic 50000 --dim 3072 --configs flat hnsw:ef_search=128 ivf_pq:pq_m=96
+
+A config is an index type optionally followed by comma-separated settings, e.g.
+"ivf_flat:nlist=256,nprobe=32" or "flat:dimensions=1024". Reduced dimensions are simulated by
+truncating and re-normalizing the vectors, which is how text-embedding-3 shortens its output.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from vector_index import build_index, index_config, sample_training_vectors  # noqa: E402
+
+DEFAULT_CONFIGS = [
+    "flat",
+    "ivf_flat:nprobe=8",
+    "ivf_flat:nprobe=32",
+    "ivf_pq:pq_m=64,nprobe=32",
+    "hnsw:ef_search=32",
+    "hnsw:ef_search=128",
+    "flat:dimensions=1024",
+    "hnsw:dimensions=1024,ef_search=128",
+]
+
+
+def parse_config(spec):
+    index_type, _, settings = spec.partition(":")
+    overrides = {}
+    for setting in filter(None, settings.split(",")):
+        key, _, value = setting.partition("=")
+        overrides[key.strip()] = int(value)
+    return index_config(type=index_type, **overrides)
+
+
+def load_vectors(index_dir):
+    """Reconstruct every vector of a saved flat index (plain or ID-mapped)."""
+    index = faiss.read_index(str(Path(index_dir) / "index.faiss"))
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(count, dim, clusters=200, seed=0):
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def reduce_dimensions(vectors, dimensions):
+    if not dimensions or dimensions >= vectors.shape[1]:
+        return vectors
+    reduced = np.ascontiguousarray(vectors[:, :dimensions])
+    return reduced / np.linalg.norm(reduced, axis=1, keepdims=True)
+
+
+def make_queries(vectors, count, seed=1):
+    """Perturbed copies of random base vectors, so each query has close but not identical neighbours."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), min(count, len(vectors)), replace=False)
+    queries = vectors[rows] + 0.05 * rng.standard_normal((len(rows), vectors.shape[1])).astype("float32")
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+
+def run(config, base, queries, ground_truth, k):
+    base = reduce_dimensions(base, config["dimensions"])
+    queries = reduce_dimensions(queries, config["dimensions"])
+    ids = np.arange(len(base), dtype="int64")
+
+    start = time.perf_counter()
+    index = build_index(config, base.shape[1], sample_training_vectors(base, config))
+    index.add_with_ids(base, ids)
+    build_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, labels = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(labels[0].tolist()) & set(truth.tolist()))
+
+    latencies.sort()
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "size_mb": faiss.serialize_index(index).nbytes / 1024 / 1024,
+        "build_s": build_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--index-dir", help="Directory holding an index.faiss built with a flat index.")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Generate N synthetic vectors instead.")
+    parser.add_argument("--dim", type=int, default=3072, help="Dimension of synthetic vectors.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    base = load_vectors(args.index_dir) if args.index_dir else synthetic_vectors(args.synthetic, args.dim)
+    base = np.ascontiguousarray(base, dtype="float32")
+    queries = make_queries(base, args.queries)
+    k = min(args.k, len(base))
+
+    # Exhaustive search at full dimension is the reference every config is scored against
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, ground_truth = exact.search(queries, k)
+
+    print(f"{len(base)} vectors x {base.shape[1]} dims, {len(queries)} queries, k={k}")
+    print(f"{'config':<36} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>9} {'build s':>8}")
+    results = {}
+    for spec in args.configs:
+        try:
+            result = run(parse_config(spec), base, queries, ground_truth, k)
+        except (ValueError, RuntimeError) as e:
+            print(f"{spec:<36} skipped: {e}")
+            continue
+        results[spec] = result
+        print(
+            f"{spec:<36} {result['recall_at_k']:>9.3f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+            f"{result['size_mb']:>9.1f} {result['build_s']:>8.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
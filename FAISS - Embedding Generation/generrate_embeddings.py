@@ -1,7 +1,12 @@
 import os
-import faiss
+import sys
+import json
+import time
+import hashlib
 import numpy as np
-from uuid import uuid4
+import tiktoken
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_experimental.text_splitter import SemanticChunker
@@ -9,61 +14,308 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.in_memory import InMemoryDocstore
 
+# Shared helpers (rate limiter, retry with backoff) live at the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from ocr_engine import RateLimiter, call_with_retry  # noqa: E402
+from prompt_builder import get_encoding  # noqa: E402
+from vector_index import (  # noqa: E402
+    build_index, index_config as make_index_config, needs_training, supports_removal,
+    rebuild_without, sample_training_vectors, apply_search_params, save_index_config,
+    load_vector_store_for_update, save_vector_store
+)
+
 # Load environment variables
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-# Initialize the embedding model
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+# Embedding model and its output dimension, so no probe request is needed to size the index
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+# Batching and rate limits for embedding requests
+MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", 50000))
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 512))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("EMBEDDING_MAX_CONCURRENT_REQUESTS", 4))
+REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 500))
+TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 1000000))
+
+# Records which source files and chunk hashes are already in an index directory
+MANIFEST_FILE = "manifest.json"
+
+# Index settings that change the stored vectors or structure; changing one forces a rebuild.
+# Query-time settings (nprobe, ef_search) are just rewritten to index_config.json.
+BUILD_SETTINGS = ("type", "dimensions", "nlist", "pq_m", "pq_nbits", "hnsw_m", "ef_construction")
+
+# Counts the tokens of each chunk to keep embedding batches under MAX_BATCH_TOKENS (estimated when
+# tiktoken cannot download its encoding, e.g. offline)
+tokenizer = get_encoding(tiktoken.encoding_name_for_model(EMBEDDING_MODEL))
+# langchain splits over-long inputs with the same tiktoken files; without them texts are sent as they are
+CHECK_CONTEXT_LENGTH = tokenizer.name != "approximate"
+
+# Initialize the embedding model (used for semantic chunking at the model's native size)
+embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, check_embedding_ctx_length=CHECK_CONTEXT_LENGTH)
+
+
+def get_embeddings(config):
+    """Embedding model producing vectors of the index's configured size."""
+    if config["dimensions"]:
+        return OpenAIEmbeddings(
+            model=EMBEDDING_MODEL, dimensions=config["dimensions"], check_embedding_ctx_length=CHECK_CONTEXT_LENGTH
+        )
+    return embeddings
+
 
-def process_documents_for_year_and_language(year, language, doc_path):
+def index_dimension(config):
+    return config["dimensions"] or EMBEDDING_DIMENSIONS[EMBEDDING_MODEL]
+
+
+def batch_chunks(chunks, max_tokens=MAX_BATCH_TOKENS, max_size=MAX_BATCH_SIZE):
     """
-    Process documents for a specific year and language, adding them to the FAISS vector store.
+    Group chunks into batches bounded by total token count and number of inputs.
+    Returns a list of (chunks, token_count) pairs.
     """
-    # Define FAISS index for local persistence
-    embedding_dimension = len(embeddings.embed_query("test"))
-    index = faiss.IndexFlatL2(embedding_dimension)
+    batches = []
+    current, current_tokens = [], 0
+    for chunk in chunks:
+        tokens = len(tokenizer.encode(chunk.page_content))
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_size):
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(chunk)
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+
+def embed_batches(batches, embedder):
+    """
+    Embed batches concurrently within the request/token rate limits.
+    Yields (chunks, vectors, token_count) as each batch completes.
+    """
+    limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+    def embed(batch):
+        chunks, token_count = batch
+
+        def request():
+            limiter.acquire(token_count)
+            return embedder.embed_documents([chunk.page_content for chunk in chunks])
 
-    # Initialize FAISS vector store with an in-memory document store
-    vector_store = FAISS(
-        embedding_function=embeddings,
+        return chunks, call_with_retry(request), token_count
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = [executor.submit(embed, batch) for batch in batches]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def file_sha256(path):
+    """Hash a source file in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(chunk):
+    """Identify a chunk by the SHA-256 of its text."""
+    return hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+
+
+def chunk_index_id(content_hash):
+    """Derive the positive int64 FAISS id of a chunk from its content hash."""
+    return int(content_hash[:15], 16)
+
+
+def load_manifest(persist_directory, config):
+    """Return the manifest of an index directory, or None if there is no index there built with this configuration."""
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path) or not os.path.exists(os.path.join(persist_directory, "index.faiss")):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != EMBEDDING_MODEL:
+        print(f"Embedding model changed ({manifest.get('model')} -> {EMBEDDING_MODEL}); rebuilding the index.")
+        return None
+    built_with = manifest.get("index", {"type": "flat"})
+    if any(built_with.get(key, config[key]) != config[key] for key in BUILD_SETTINGS):
+        print("Index settings changed; rebuilding the index.")
+        return None
+    return manifest
+
+
+def save_manifest(persist_directory, manifest):
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def new_vector_store(config):
+    """
+    Create an empty vector store whose index accepts ids, so chunks can be added and removed by id.
+    Index types that need training get their index once the first vectors are embedded.
+    """
+    index = None if needs_training(config) else build_index(config, index_dimension(config))
+    return FAISS(
+        embedding_function=get_embeddings(config),
         index=index,
         docstore=InMemoryDocstore(),
         index_to_docstore_id={}
     )
 
+
+def add_chunks(vector_store, chunks, vectors):
+    """Bulk-add embedded chunks to the index and docstore, keyed by content hash."""
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    ids = np.array([chunk_index_id(h) for h in hashes], dtype="int64")
+    vector_store.index.add_with_ids(np.array(vectors, dtype="float32"), ids)
+    vector_store.docstore.add(dict(zip(hashes, chunks)))
+    vector_store.index_to_docstore_id.update(zip(ids.tolist(), hashes))
+
+
+def remove_chunks(vector_store, hashes, config):
+    """Delete chunks from the index and docstore by content hash."""
+    if not hashes:
+        return
+    ids = [chunk_index_id(h) for h in hashes]
+    if supports_removal(config):
+        vector_store.index.remove_ids(np.array(ids, dtype="int64"))
+    else:
+        vector_store.index = rebuild_without(vector_store.index, config, ids)
+    vector_store.docstore.delete(list(hashes))
+    for index_id in ids:
+        vector_store.index_to_docstore_id.pop(index_id, None)
+
+
+def load_and_chunk(doc_path, language, text_splitter):
+    """Load a PDF and split it into semantic chunks tagged with language and source."""
+    documents = PyPDFLoader(doc_path).load()
+    chunks = text_splitter.create_documents([doc.page_content for doc in documents])
+    for chunk in chunks:
+        chunk.metadata["language"] = language  # Tag the chunk by language
+        chunk.metadata["source"] = os.path.basename(doc_path)
+    return chunks
+
+
+def process_documents_for_year_and_language(year, language, doc_paths, incremental=True, index_config=None):
+    """
+    Process documents for a specific year and language, adding them to the FAISS vector store.
+
+    doc_paths is the complete set of source PDFs for this year and language. In incremental mode the
+    existing index is updated in place: unchanged files are skipped without any embedding call, only
+    chunks whose content hash is not indexed yet are embedded, and chunks of removed or changed files
+    that no other file still contains are deleted from the index and docstore.
+
+    index_config selects the FAISS index type and its parameters (see vector_index.DEFAULT_INDEX_CONFIG);
+    it is saved as index_config.json so the analysis page applies the same search settings.
+    """
+    config = make_index_config(**(index_config or {}))
+    if isinstance(doc_paths, str):
+        doc_paths = [doc_paths]
+
+    # Define persistence directory
+    persist_directory = f"./faiss_indexes/{year}/{language}/"
+    os.makedirs(persist_directory, exist_ok=True)
+
+    manifest = load_manifest(persist_directory, config) if incremental else None
+    if manifest is None:
+        manifest = {"model": EMBEDDING_MODEL, "dimension": index_dimension(config), "files": {}}
+        vector_store = new_vector_store(config)
+    else:
+        vector_store = load_vector_store_for_update(persist_directory, get_embeddings(config))
+        apply_search_params(vector_store.index, config)
+
     # Use SemanticChunker with percentile-based threshold for chunking
     text_splitter = SemanticChunker(
         embeddings, 
         breakpoint_threshold_type="percentile"
     )
 
-    # Load and process the document
-    if doc_path.endswith(".pdf"):
-        loader = PyPDFLoader(doc_path)
-    else:
-        print(f"Unsupported file format: {doc_path}")
+    # Work out which source files changed since the last run
+    old_files = manifest["files"]
+    new_files = {}
+    new_chunks = {}
+    for doc_path in doc_paths:
+        if not doc_path.endswith(".pdf"):
+            print(f"Unsupported file format: {doc_path}")
+            continue
+        key = os.path.basename(doc_path)
+        file_hash = file_sha256(doc_path)
+        if key in old_files and old_files[key]["sha256"] == file_hash:
+            new_files[key] = old_files[key]
+            continue
+
+        # Load document content and apply semantic chunking
+        chunks = load_and_chunk(doc_path, language, text_splitter)
+        for chunk in chunks:
+            new_chunks.setdefault(chunk_hash(chunk), chunk)
+        new_files[key] = {"sha256": file_hash, "chunks": sorted({chunk_hash(chunk) for chunk in chunks})}
+
+    indexed = {h for entry in old_files.values() for h in entry["chunks"]}
+    wanted = {h for entry in new_files.values() for h in entry["chunks"]}
+    stale = indexed - wanted
+    to_embed = [chunk for h, chunk in new_chunks.items() if h not in indexed]
+
+    if not stale and not to_embed and new_files.keys() == old_files.keys():
+        save_index_config(persist_directory, config)
+        print(f"Index for year {year} in {language} is up to date; nothing to embed.")
         return
 
-    # Load document content and apply semantic chunking
-    documents = loader.load()
-    chunks = text_splitter.create_documents([doc.page_content for doc in documents])
+    if vector_store.index is not None:
+        remove_chunks(vector_store, stale, config)
 
-    # Add chunks to FAISS index and document store
-    uuids = [str(uuid4()) for _ in range(len(chunks))]
-    for i, chunk in enumerate(chunks):
-        chunk.metadata["language"] = language  # Tag the chunk by language
-        vector_store.add_documents(documents=[chunk], ids=[uuids[i]])
+    # Embed token-bounded batches concurrently and add each batch to the index in one bulk call
+    start_time = time.perf_counter()
+    total_chunks, total_tokens = 0, 0
+    batches = batch_chunks(to_embed)
+    pending = []
+    for embedded_chunks, vectors, token_count in embed_batches(batches, get_embeddings(config)):
+        if vector_store.index is None:
+            # Untrained index type: hold vectors until the training sample is complete
+            pending.append((embedded_chunks, vectors))
+        else:
+            add_chunks(vector_store, embedded_chunks, vectors)
+        total_chunks += len(embedded_chunks)
+        total_tokens += token_count
+    if pending:
+        all_vectors = np.array([vector for _, vectors in pending for vector in vectors], dtype="float32")
+        vector_store.index = build_index(config, index_dimension(config), sample_training_vectors(all_vectors, config))
+        for embedded_chunks, vectors in pending:
+            add_chunks(vector_store, embedded_chunks, vectors)
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
 
-    # Define persistence directory
-    persist_directory = f"./faiss_indexes/{year}/{language}/"
-    os.makedirs(persist_directory, exist_ok=True)
+    if vector_store.index is None:
+        print(f"No chunks to index for year {year} in {language}.")
+        return
 
-    # Save FAISS index locally
-    faiss.write_index(index, os.path.join(persist_directory, "faiss_index.bin"))
+    # Save FAISS index, docstore, index settings and manifest locally
+    save_vector_store(vector_store, persist_directory)
+    save_index_config(persist_directory, config)
+    manifest["files"] = new_files
+    manifest["index"] = {key: config[key] for key in BUILD_SETTINGS}
+    save_manifest(persist_directory, manifest)
     print(f"Processed and stored embeddings for year {year} in {language}.")
+    print(
+        f"Files: {len(new_files)} indexed, {len(set(old_files) - set(new_files))} removed. "
+        f"Chunks: {len(to_embed)} added, {len(stale)} removed, {vector_store.index.ntotal} total."
+    )
+    print(
+        f"Embedded {total_chunks} chunks ({total_tokens} tokens) in {len(batches)} batches "
+        f"over {elapsed:.1f}s: {total_chunks / elapsed:.1f} chunks/s, {total_tokens / elapsed:.0f} tokens/s."
+    )
+
 
-# Usage example for both English and Arabic documents
-year = 2024
-process_documents_for_year_and_language(year, "English", "./docs/2024/document_en.pdf")
-process_documents_for_year_and_language(year, "Arabic", "./docs/2024/document_ar.pdf")
+if __name__ == "__main__":
+    # Usage example for both English and Arabic documents; re-running only embeds what changed.
+    # Pass e.g. index_config={"type": "hnsw"} or {"type": "ivf_pq", "dimensions": 1024} to pick
+    # another index type; compare them first with benchmark_index_types.py.
+    year = 2024
+    process_documents_for_year_and_language(year, "English", ["./docs/2024/document_en.pdf"])
+    process_documents_for_year_and_language(year, "Arabic", ["./docs/2024/document_ar.pdf"])
@@ -0,0 +1,74 @@
+"""
+Offline benchmark of the page image encoding profiles.
+
+Renders every page of the given PDFs (or a generated sample document) with each profile in
+image_encoding.ENCODING_PROFILES and reports bytes per page and encode time per page:
+    python benchmarks/bench_image_encoding.py evidence.pdf scanned.pdf
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import fitz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_encoding import ENCODING_PROFILES, encode_pdf_page, get_profile  # noqa: E402
+
+SAMPLE_TEXT = (
+    "Compliance evidence sample. The organisation maintains an information security policy "
+    "approved by senior management and reviewed annually. "
+)
+
+
+def sample_document(pages=5):
+    """Build an A4 document of dense text pages, plus one scanned-looking image-only page."""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), SAMPLE_TEXT * 30, fontsize=10)
+        page.insert_text((50, 820), f"Page {number + 1}", fontsize=8)
+    scanned = fitz.open()
+    scanned.insert_pdf(doc, from_page=0, to_page=0)
+    pix = scanned[0].get_pixmap(dpi=150)
+    image_page = doc.new_page(width=595, height=842)
+    image_page.insert_image(image_page.rect, pixmap=pix)
+    return doc
+
+
+def benchmark(documents, profile_names):
+    rows = []
+    for name in profile_names:
+        profile = get_profile(name)
+        sizes, timings = [], []
+        for doc in documents:
+            for page in doc:
+                start = time.perf_counter()
+                image_bytes, _ = encode_pdf_page(page, profile)
+                timings.append(time.perf_counter() - start)
+                sizes.append(len(image_bytes))
+        rows.append((name, profile, statistics.mean(sizes), max(sizes), statistics.mean(timings) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", help="PDF files to render; a sample document is generated if omitted.")
+    parser.add_argument("--profiles", nargs="+", default=list(ENCODING_PROFILES))
+    args = parser.parse_args()
+
+    documents = [fitz.open(path) for path in args.pdfs] or [sample_document()]
+    pages = sum(len(doc) for doc in documents)
+    print(f"{pages} page(s)")
+    print(f"{'profile':>10} {'format':>6} {'avg KB/page':>12} {'max KB':>8} {'base64 KB':>10} {'ms/page':>8}")
+    for name, profile, avg_size, max_size, avg_ms in benchmark(documents, args.profiles):
+        print(
+            f"{name:>10} {profile['format']:>6} {avg_size / 1024:>12.1f} {max_size / 1024:>8.1f} "
+            f"{avg_size * 4 / 3 / 1024:>10.1f} {avg_ms:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
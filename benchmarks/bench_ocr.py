@@ -0,0 +1,65 @@
+"""
+Offline throughput benchmark for the concurrent OCR engine.
+
+Starts the fake OpenAI server in-process and OCRs a synthetic document at several concurrency
+levels, printing pages/s, retries and failed pages for each:
+    python benchmarks/bench_ocr.py --pages 40 --latency 0.8 --rate-429 0.05
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from openai import OpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_engine import extract_pages  # noqa: E402
+from fake_openai_server import start_server  # noqa: E402
+
+# 1x1 transparent PNG; the fake server never looks at the image
+TINY_PNG = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+def run(client, pages, workers, requests_per_minute):
+    page_items = ((idx, f"data:image/png;base64,{TINY_PNG}") for idx in range(1, pages + 1))
+    start = time.perf_counter()
+    results = extract_pages(
+        client,
+        page_items,
+        max_workers=workers,
+        requests_per_minute=requests_per_minute,
+        max_retries=5,
+    )
+    elapsed = time.perf_counter() - start
+    retries = sum(r["attempts"] - 1 for r in results)
+    failed = sum(1 for r in results if r["error"])
+    in_order = [r["page"] for r in results] == list(range(1, pages + 1))
+    return elapsed, retries, failed, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None, help="Client-side requests-per-minute budget.")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500)
+    client = OpenAI(api_key="fake", base_url=server.base_url)
+    try:
+        print(f"{'workers':>8} {'seconds':>8} {'pages/s':>8} {'retries':>8} {'failed':>7} {'ordered':>8}")
+        for workers in args.workers:
+            elapsed, retries, failed, in_order = run(client, args.pages, workers, args.rpm)
+            print(f"{workers:>8} {elapsed:>8.2f} {args.pages / elapsed:>8.2f} {retries:>8} {failed:>7} {str(in_order):>8}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Offline end-to-end benchmark of the compliance pipeline, with local stand-ins for every service.
+
+Starts the fake OpenAI server in-process (vision OCR, streamed chat and embeddings), uses an in-memory
+MongoDB (mongomock) or a scratch database on a local MongoDB, and generates synthetic PDFs of varying
+page counts in which a share of the pages are scanned images. It then measures the ingestion script,
+OCR (process_documents_with_vision), retrieval (retrieve_with_scores), the LLM chain and whole checks
+(check_pointer, cold and warm caches), and prints throughput, latency and peak memory as JSON:
+    python benchmarks/bench_pipeline.py --pointers 8 --pages 2 8 24 --scanned 0.5 --latency 0.3 --rate-429 0.05
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json --tolerance 0.25    # exit code 1 on regression
+
+Everything runs in a scratch directory holding the generated PDFs, the built index, the local blob store
+and a .streamlit/secrets.toml with the settings used; it is removed afterwards unless --keep is given.
+--skip-ingestion builds the index directly instead of running the ingestion script, e.g. to time only the
+check path. Without tiktoken's encoding files (offline) token counts in ingestion and prompts are estimated.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import fitz
+import pymongo
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from openai import OpenAI
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+import streamlit as st  # noqa: E402
+
+from compliance_pipeline import (  # noqa: E402
+    LLM_MODEL, load_settings, process_documents_with_vision, retrieve_with_scores, filter_relevant_chunks,
+    evaluate_compliance, check_pointer
+)
+from db_connection import use_database, ensure_indexes  # noqa: E402
+from document_operations import add_document, get_documents_by_pointer  # noqa: E402
+from fake_openai_server import start_server  # noqa: E402
+from pipeline_metrics import add_trace, percentile, summarize  # noqa: E402
+from pointer_operations import add_pointer  # noqa: E402
+from vector_index import index_config, save_index_config, save_vector_store  # noqa: E402
+from vector_store_registry import EMBEDDING_MODEL, VectorStoreRegistry  # noqa: E402
+
+YEAR = 2024
+LANGUAGE = "English"
+# Shortened vectors keep the synthetic index small; the ingestion script uses the model's native size
+EMBEDDING_DIMENSIONS = 256
+# Cleared before the cold checks: OCR pages, extracted document text, query embeddings, verdicts and their size totals
+COLD_COLLECTIONS = ("ocr_cache", "document_text", "document_embeddings", "llm_cache", "cache_sizes")
+
+SUBJECTS = ["The entity", "Each department", "The board", "Management", "The data owner", "The service provider"]
+DUTIES = ["shall maintain", "shall review", "shall document", "shall approve", "shall monitor", "shall report on"]
+OBJECTS = [
+    "the access control policy", "the incident response plan", "the asset inventory", "the risk register",
+    "backup and recovery procedures", "third-party contracts", "training records", "audit logs",
+]
+FREQUENCIES = ["annually", "every quarter", "after every major change", "at least monthly", "on request"]
+
+COMPLETION_TEXT = (
+    "**Compliance Status**: Partially Compliant\n"
+    "**Reasons for Compliance Status**:\n"
+    "- The evidence shows the access control policy is documented and approved by management.\n"
+    "- Quarterly reviews are referenced but no review records were provided.\n"
+    "- Sub-requirement A: Met - The policy is published and versioned.\n"
+    "- Sub-requirement B: Not Met - No evidence of periodic access reviews."
+)
+
+
+def sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(DUTIES)} {rng.choice(OBJECTS)} {rng.choice(FREQUENCIES)}."
+
+
+def paragraph(rng, sentences=12):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def make_pdf(pages, scanned_share, rng):
+    """A PDF with the given number of text pages, of which about scanned_share are image-only scans."""
+    pdf = fitz.open()
+    for _ in range(pages):
+        text = paragraph(rng, 30)
+        page = pdf.new_page()
+        if rng.random() < scanned_share:
+            # Render the text on a scratch page and keep only the picture, like a scanner would
+            with fitz.open() as scratch:
+                source = scratch.new_page()
+                source.insert_textbox(source.rect + (50, 50, -50, -50), text, fontsize=11)
+                pixmap = source.get_pixmap(dpi=100, colorspace=fitz.csGRAY)
+            page.insert_image(page.rect, pixmap=pixmap)
+        else:
+            page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=11)
+    data = pdf.tobytes(garbage=3, deflate=True)
+    pdf.close()
+    return data
+
+
+def write_secrets(workdir, args):
+    """The settings the run uses, written where st.secrets looks for them (the working directory)."""
+    os.makedirs(os.path.join(workdir, ".streamlit"), exist_ok=True)
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write(
+            "[storage]\n"
+            'backend = "local"\n'
+            'local_path = "blobs"\n\n'
+            "[ocr]\n"
+            f"max_workers = {args.ocr_workers}\n"
+            "max_retries = 8\n\n"
+            "[vector_store]\n"
+            'root = "faiss_indexes"\n'
+        )
+
+
+def measure(function):
+    """Run function, returning (result, seconds, peak traced memory in MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def stage_report(seconds, peak_mb, items, unit, latencies):
+    report = {
+        "seconds": round(seconds, 4),
+        unit: items,
+        "per_second": round(items / seconds, 3) if seconds else None,
+        "unit": unit,
+        "peak_memory_mb": round(peak_mb, 2),
+    }
+    if latencies:
+        report["p50_seconds"] = round(percentile(latencies, 0.5), 4)
+        report["p95_seconds"] = round(percentile(latencies, 0.95), 4)
+    return report
+
+
+def run_ingestion(workdir, base_url, args, rng):
+    """Index synthetic regulation PDFs with the ingestion script, as the maintainers do for a new year."""
+    docs_dir = os.path.join(workdir, "docs", str(YEAR))
+    os.makedirs(docs_dir, exist_ok=True)
+    paths = []
+    for number in range(args.regulation_documents):
+        path = os.path.join(docs_dir, f"regulation_{number}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(args.regulation_pages, 0.0, rng))
+        paths.append(path)
+
+    # The script creates its OpenAI clients at import time from the environment
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_API_BASE"] = base_url
+    os.environ["OPENAI_BASE_URL"] = base_url
+    sys.path.insert(0, str(REPO_ROOT / "FAISS - Embedding Generation"))
+    import generrate_embeddings
+
+    _, seconds, peak_mb = measure(lambda: generrate_embeddings.process_documents_for_year_and_language(
+        YEAR, LANGUAGE, paths, index_config={"dimensions": EMBEDDING_DIMENSIONS}
+    ))
+    return stage_report(seconds, peak_mb, args.regulation_documents * args.regulation_pages, "pages", [])
+
+
+def build_index_directly(workdir, embeddings, args, rng):
+    """Stand-in for the ingestion script: one chunk per regulation paragraph, saved in the same layout."""
+    chunks = [
+        Document(page_content=paragraph(rng), metadata={"language": LANGUAGE, "source": f"regulation_{number}.pdf"})
+        for number in range(args.regulation_documents)
+        for _ in range(args.regulation_pages * 3)
+    ]
+    directory = os.path.join(workdir, "faiss_indexes", str(YEAR), LANGUAGE)
+    vector_store = FAISS.from_documents(chunks, embeddings)
+    save_vector_store(vector_store, directory)
+    save_index_config(directory, index_config(dimensions=EMBEDDING_DIMENSIONS))
+
+
+def seed_pointers(args, rng):
+    """Pointers with uploaded evidence PDFs whose page counts cycle through args.pages."""
+    pointers = []
+    for number in range(args.pointers):
+        pointer = {
+            "name": f"Pointer {number}",
+            "objective": sentence(rng),
+            "compliance_requirements": "\n".join(f"- {sentence(rng)}" for _ in range(4)),
+            "supporting_document_points": "\n".join(f"- {sentence(rng)}" for _ in range(2)),
+            "language": LANGUAGE,
+            "year": YEAR,
+            "compliance_status": "Not Checked",
+        }
+        pointer["_id"] = add_pointer(pointer)
+        for document in range(args.documents_per_pointer):
+            pages = args.pages[(number * args.documents_per_pointer + document) % len(args.pages)]
+            add_document(pointer["_id"], f"evidence_{number}_{document}.pdf", make_pdf(pages, args.scanned, rng))
+        pointers.append(pointer)
+    return pointers
+
+
+def run_stages(pointers, client, llm, registry, settings):
+    """Time each pipeline stage on its own over all pointers."""
+    report = {}
+    documents = {pointer["_id"]: get_documents_by_pointer(pointer["_id"]) for pointer in pointers}
+    evidence, latencies, errors, page_counts = {}, [], [], {"native": 0, "ocr": 0}
+
+    def ocr_all():
+        for pointer in pointers:
+            start = time.perf_counter()
+            evidence[pointer["_id"]], stats = process_documents_with_vision(documents[pointer["_id"]], client, settings, errors)
+            latencies.append(time.perf_counter() - start)
+            page_counts["native"] += stats["native"]
+            page_counts["ocr"] += stats["misses"] + stats["hits"]
+
+    _, seconds, peak_mb = measure(ocr_all)
+    pages = page_counts["native"] + page_counts["ocr"]
+    report["ocr"] = {**stage_report(seconds, peak_mb, pages, "pages", latencies), **page_counts, "errors": len(errors)}
+
+    vector_store = registry.get(YEAR, LANGUAGE)
+    chunks, latencies = {}, []
+
+    def retrieve_all():
+        for pointer in pointers:
+            start = time.perf_counter()
+            chunks[pointer["_id"]] = filter_relevant_chunks(retrieve_with_scores(
+                evidence[pointer["_id"]], pointer["compliance_requirements"], vector_store, settings
+            ))
+            latencies.append(time.perf_counter() - start)
+
+    _, seconds, peak_mb = measure(retrieve_all)
+    report["retrieval"] = stage_report(seconds, peak_mb, len(pointers), "checks", latencies)
+
+    latencies, first_token = [], []
+    llm_settings = {**settings, "llm_cache": {**settings["llm_cache"], "enabled": False}}
+
+    def evaluate_all():
+        for pointer in pointers:
+            start = time.perf_counter()
+            _, _, metadata = evaluate_compliance(
+                pointer, chunks[pointer["_id"]], evidence[pointer["_id"]], llm, llm_settings
+            )
+            latencies.append(time.perf_counter() - start)
+            if metadata["llm_timing"]["ttft_seconds"] is not None:
+                first_token.append(metadata["llm_timing"]["ttft_seconds"])
+
+    _, seconds, peak_mb = measure(evaluate_all)
+    report["llm"] = stage_report(seconds, peak_mb, len(pointers), "checks", latencies)
+    if first_token:
+        report["llm"]["ttft_p50_seconds"] = round(percentile(first_token, 0.5), 4)
+    return report
+
+
+def run_checks(pointers, client, llm, registry, settings):
+    """Whole checks through check_pointer, with per-stage percentiles from their traces."""
+    stages, latencies = {}, []
+
+    def check_all():
+        for pointer in pointers:
+            start = time.perf_counter()
+            result = check_pointer(pointer, client, llm, registry, settings)
+            latencies.append(time.perf_counter() - start)
+            add_trace(stages, result["metadata"]["trace"])
+
+    _, seconds, peak_mb = measure(check_all)
+    report = stage_report(seconds, peak_mb, len(pointers), "checks", latencies)
+    report["stages"] = {
+        row["stage"]: {key: round(value, 4) if isinstance(value, float) else value for key, value in row.items() if key != "stage"}
+        for row in summarize(stages)
+    }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than tolerance (a fraction)."""
+    regressions = []
+    for name, stage in report["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        for metric, higher_is_worse in (("p95_seconds", True), ("per_second", False), ("peak_memory_mb", True)):
+            old, new = before.get(metric), stage.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pointers", type=int, default=8)
+    parser.add_argument("--documents-per-pointer", type=int, default=1)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 8, 24], help="Evidence PDF page counts, cycled through.")
+    parser.add_argument("--scanned", type=float, default=0.5, help="Share of evidence pages that are scanned images.")
+    parser.add_argument("--regulation-documents", type=int, default=3)
+    parser.add_argument("--regulation-pages", type=int, default=10)
+    parser.add_argument("--skip-ingestion", action="store_true", help="Build the index directly instead.")
+    parser.add_argument("--ocr-workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean fake API latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--stream-interval", type=float, default=0.005, help="Seconds between streamed words.")
+    parser.add_argument("--mongo-uri", help="Use a scratch database on this MongoDB instead of mongomock.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before it counts as a regression.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory and database.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    server = start_server(
+        latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+        completion_text=COMPLETION_TEXT, ocr_text=paragraph(rng, 30), stream_interval=args.stream_interval
+    )
+    if args.mongo_uri:
+        mongo_client = pymongo.MongoClient(args.mongo_uri)
+        mongo_client.drop_database("compliance_bench_pipeline")
+        db = mongo_client["compliance_bench_pipeline"]
+    else:
+        import mongomock
+        mongo_client = None
+        db = mongomock.MongoClient()["compliance_bench_pipeline"]
+    use_database(db)
+    ensure_indexes(db)
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    original_cwd = os.getcwd()
+    try:
+        # Relative paths (blob store, index root, the ingestion script's output) resolve in the scratch directory
+        write_secrets(workdir, args)
+        os.chdir(workdir)
+        settings = load_settings(st.secrets)
+        client = OpenAI(api_key="fake", base_url=server.base_url)
+        llm = ChatOpenAI(model=LLM_MODEL, openai_api_key="fake", openai_api_base=server.base_url)
+
+        def embeddings_for(config):
+            # Raw text input: the fake server does not need tiktoken's token ids
+            return OpenAIEmbeddings(
+                model=EMBEDDING_MODEL, dimensions=config["dimensions"], openai_api_key="fake",
+                openai_api_base=server.base_url, check_embedding_ctx_length=False
+            )
+
+        report = {"config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}, "stages": {}}
+        if args.skip_ingestion:
+            build_index_directly(workdir, embeddings_for(index_config(dimensions=EMBEDDING_DIMENSIONS)), args, rng)
+        else:
+            report["stages"]["ingestion"] = run_ingestion(workdir, server.base_url, args, rng)
+        registry = VectorStoreRegistry("faiss_indexes", embeddings_for)
+
+        pointers, seconds, peak_mb = measure(lambda: seed_pointers(args, rng))
+        report["stages"]["upload"] = stage_report(
+            seconds, peak_mb, len(pointers) * args.documents_per_pointer, "documents", []
+        )
+        report["stages"].update(run_stages(pointers, client, llm, registry, settings))
+
+        # Everything a check can reuse from earlier work, including the text stored by the ocr stage above
+        for collection in COLD_COLLECTIONS:
+            db[collection].delete_many({})
+        report["stages"]["check_cold"] = run_checks(pointers, client, llm, registry, settings)
+        report["stages"]["check_warm"] = run_checks(pointers, client, llm, registry, settings)
+
+        report["api_requests"] = dict(server.request_counts)
+        report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    finally:
+        os.chdir(original_cwd)
+        server.shutdown()
+        use_database(None)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+            if mongo_client is not None:
+                mongo_client.drop_database("compliance_bench_pipeline")
+        else:
+            print(f"Scratch directory kept at {workdir}", file=sys.stderr)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
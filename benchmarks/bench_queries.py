@@ -0,0 +1,122 @@
+"""
+Micro-benchmark of the streamed/projected query API against the list-returning functions.
+
+Seeds a scratch database on a local MongoDB, then measures latency and peak Python memory of
+get_all_pointers / get_compliance_results_by_pointer versus iter_pointers, get_pointers_page
+and iter_compliance_results with projections:
+    python benchmarks/bench_queries.py --uri mongodb://localhost:27017 --pointers 2000
+The scratch database is dropped afterwards unless --keep is given.
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pymongo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_connection import use_database  # noqa: E402
+from pointer_operations import get_all_pointers, iter_pointers, get_pointers_page  # noqa: E402
+from compliance_operations import get_compliance_results_by_pointer, iter_compliance_results  # noqa: E402
+
+STATUSES = ["Fully Compliant", "Partially Compliant", "Not Compliant", "Not Checked"]
+FILLER = "The organisation shall maintain documented evidence of this control. " * 20
+
+
+def seed(db, pointers, results_per_pointer):
+    db["pointers"].insert_many([
+        {
+            "name": f"Pointer {i}",
+            "objective": FILLER,
+            "compliance_requirements": FILLER,
+            "supporting_document_points": FILLER,
+            "language": random.choice(["English", "Arabic"]),
+            "year": random.choice([2023, 2024]),
+            "compliance_status": random.choice(STATUSES),
+        }
+        for i in range(pointers)
+    ])
+    pointer_ids = [p["_id"] for p in db["pointers"].find({}, {"_id": 1})]
+    now = datetime.now()
+    db["compliance_results"].insert_many([
+        {
+            "pointer_id": pointer_id,
+            "compliance_status": random.choice(STATUSES),
+            "details": FILLER,
+            "checked_date": now - timedelta(minutes=n),
+        }
+        for pointer_id in pointer_ids
+        for n in range(results_per_pointer)
+    ])
+    db["compliance_results"].create_index([("pointer_id", 1), ("checked_date", -1)])
+    return pointer_ids
+
+
+def measure(label, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<62} {count:>7} {elapsed * 1000:>10.1f} {peak / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="compliance_bench")
+    parser.add_argument("--pointers", type=int, default=2000)
+    parser.add_argument("--results-per-pointer", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database.")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.uri)
+    client.drop_database(args.db_name)
+    db = client[args.db_name]
+    use_database(db)
+    pointer_ids = seed(db, args.pointers, args.results_per_pointer)
+    sample_pointer = random.choice(pointer_ids)
+
+    def count(iterable):
+        return sum(1 for _ in iterable)
+
+    print(f"{'query':<62} {'rows':>7} {'ms':>10} {'peak KB':>12}")
+    try:
+        measure("get_all_pointers()", lambda: len(get_all_pointers()))
+        measure(
+            "iter_pointers(projection name/status)",
+            lambda: count(iter_pointers(projection={"name": 1, "compliance_status": 1}, batch_size=args.batch_size)),
+        )
+        measure(
+            "iter_pointers(year=2024, status='Not Checked', projection)",
+            lambda: count(iter_pointers(year=2024, status="Not Checked", projection={"name": 1}, batch_size=args.batch_size)),
+        )
+
+        def walk_pages():
+            total, after = 0, None
+            while True:
+                page, after = get_pointers_page(projection={"name": 1}, after=after, limit=args.batch_size)
+                total += len(page)
+                if after is None:
+                    return total
+
+        measure("get_pointers_page(projection name) over all pages", walk_pages)
+        measure("get_compliance_results_by_pointer(pointer)", lambda: len(get_compliance_results_by_pointer(sample_pointer)))
+        measure(
+            "iter_compliance_results(pointer, projection status/date)",
+            lambda: count(iter_compliance_results(sample_pointer, projection={"compliance_status": 1, "checked_date": 1})),
+        )
+    finally:
+        use_database(None)
+        if not args.keep:
+            client.drop_database(args.db_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Local stand-in for the OpenAI HTTP API, used to benchmark the pipeline offline.
+
+Run it standalone:
+    python benchmarks/fake_openai_server.py --port 8999 --latency 0.8 --rate-429 0.05
+
+and point an OpenAI client at it with base_url="http://127.0.0.1:8999/v1".
+
+Chat requests carrying an image get ocr_text back, other chat requests completion_text (streamed as
+server-sent events when the request asks for stream=True). /embeddings returns unit vectors derived
+from a hash of each input, so equal texts always get equal vectors.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers /v1/chat/completions and /v1/embeddings with canned responses after a configurable delay."""
+
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        options = self.server.options
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record_request(self.path)
+
+        time.sleep(max(0.0, random.gauss(options["latency"], options["jitter"])))
+
+        roll = random.random()
+        if roll < options["rate_429"]:
+            self.server.record_request("429")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+                headers={"retry-after": str(options["retry_after"])},
+            )
+            return
+        if roll < options["rate_429"] + options["rate_500"]:
+            self.server.record_request("500")
+            self._send_json(500, {"error": {"message": "Internal error (fake)", "type": "server_error"}})
+            return
+
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions") and request.get("stream"):
+            self._stream_chat_completion(request)
+        elif path.endswith("/chat/completions"):
+            self._send_json(200, self._chat_completion(request))
+        elif path.endswith("/embeddings"):
+            self._send_json(200, self._embeddings(request))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _answer_text(self, request):
+        """ocr_text for requests with an image attached (vision OCR), completion_text otherwise."""
+        for message in request.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+                return self.server.options["ocr_text"]
+        return self.server.options["completion_text"]
+
+    def _chat_completion(self, request):
+        text = self._answer_text(request)
+        return {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": len(text.split()), "total_tokens": 1000 + len(text.split())},
+        }
+
+    def _stream_chat_completion(self, request):
+        """Send the answer word by word as server-sent events, stream_interval seconds apart."""
+        text = self._answer_text(request)
+        completion_id = f"chatcmpl-fake-{random.getrandbits(32):08x}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def send(delta, finish_reason=None, **extra):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            send({"content": word if i == len(words) - 1 else word + " "})
+            time.sleep(self.server.options["stream_interval"])
+        send({}, finish_reason="stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": 1000, "completion_tokens": len(words), "total_tokens": 1000 + len(words)}
+            self.wfile.write(f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _embeddings(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = request.get("dimensions") or self.server.options["embedding_dimensions"]
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                vector = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(text) // 4 + 1 for text in map(str, inputs))
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def fake_embedding(text, dimensions):
+    """Deterministic unit vector for a text (or token list), seeded by its hash."""
+    seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, FakeOpenAIHandler)
+        self.options = options
+        # Requests per path, plus the number of injected "429" and "500" responses
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+
+    def record_request(self, path):
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_server(
+    port=0,
+    latency=0.5,
+    jitter=0.1,
+    rate_429=0.0,
+    rate_500=0.0,
+    retry_after=0.2,
+    completion_text="Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+    ocr_text="Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+    stream_interval=0.0,
+    embedding_dimensions=3072,
+):
+    """Start the fake server on a background thread and return it; call shutdown() when done."""
+    options = {
+        "latency": latency,
+        "jitter": jitter,
+        "rate_429": rate_429,
+        "rate_500": rate_500,
+        "retry_after": retry_after,
+        "completion_text": completion_text,
+        "ocr_text": ocr_text,
+        "stream_interval": stream_interval,
+        "embedding_dimensions": embedding_dimensions,
+    }
+    server = FakeOpenAIServer(("127.0.0.1", port), options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Standard deviation of the latency.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="retry-after header sent with 429s.")
+    parser.add_argument("--stream-interval", type=float, default=0.0, help="Seconds between streamed words.")
+    args = parser.parse_args()
+
+    server = start_server(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        retry_after=args.retry_after,
+        stream_interval=args.stream_interval,
+    )
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from db_connection import get_database, iter_documents
+from tracing import traced
+from datetime import datetime
+from pymongo import ReturnDocument
+
+# One entry per stored blob, keyed by the SHA-256 of its bytes; refcount is the number of
+# documents pointing at it, so an attachment shared by many pointers is stored once
+
+@traced
+def acquire_blob(content_hash):
+    """
+    Takes a reference on the blob already stored for a content hash and returns its entry,
+    or None if no blob with that content exists yet.
+    """
+    db = get_database()
+    blobs_collection = db["blobs"]
+    return blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {"$inc": {"refcount": 1}, "$set": {"last_acquired": datetime.now()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+@traced
+def register_blob(content_hash, storage, blob_id, size):
+    """
+    Records a newly stored blob and takes a reference on it. If another upload registered the
+    same content first, the reference is taken on that blob instead; the caller should then
+    delete its own copy. Returns the blob entry that holds the reference.
+    """
+    db = get_database()
+    blobs_collection = db["blobs"]
+    now = datetime.now()
+    return blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {
+            "$setOnInsert": {"storage": storage, "blob_id": blob_id, "size": size, "created_at": now},
+            "$inc": {"refcount": 1},
+            "$set": {"last_acquired": now}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+@traced
+def release_blob(content_hash):
+    """
+    Drops one reference on a blob. Returns the entry of a blob that is no longer referenced
+    (already removed from the collection, so the caller must delete its bytes), otherwise None.
+    """
+    db = get_database()
+    blobs_collection = db["blobs"]
+    entry = blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {"$inc": {"refcount": -1}, "$set": {"last_released": datetime.now()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if entry is None or entry["refcount"] > 0:
+        return None
+    # Only remove it if no upload took a new reference in the meantime
+    result = blobs_collection.delete_one({"_id": content_hash, "refcount": {"$lte": 0}})
+    return entry if result.deleted_count else None
+
+@traced
+def get_blob(content_hash):
+    db = get_database()
+    blobs_collection = db["blobs"]
+    return blobs_collection.find_one({"_id": content_hash})
+
+def iter_blobs(query=None, batch_size=100):
+    """
+    Streams blob entries matching the query.
+    """
+    db = get_database()
+    blobs_collection = db["blobs"]
+    return iter_documents(blobs_collection, query, batch_size=batch_size)
+
+@traced
+def set_blob_refcount(content_hash, refcount):
+    """
+    Overwrites a blob's reference count, e.g. after recounting its documents.
+    """
+    db = get_database()
+    blobs_collection = db["blobs"]
+    result = blobs_collection.update_one({"_id": content_hash}, {"$set": {"refcount": refcount}})
+    return result.modified_count
+
+@traced
+def delete_blob_entry(content_hash):
+    db = get_database()
+    blobs_collection = db["blobs"]
+    result = blobs_collection.delete_one({"_id": content_hash})
+    return result.deleted_count
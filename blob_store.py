@@ -0,0 +1,146 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import gridfs
+import streamlit as st
+from bson.objectid import ObjectId
+
+from db_connection import get_database
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_stream(source, write):
+    """Copy a readable stream in fixed-size chunks, returning (size, sha256 hex digest)."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        write(chunk)
+    return size, digest.hexdigest()
+
+
+def hash_seekable_stream(stream):
+    """SHA-256 of a seekable stream's remaining bytes, rewinding it afterwards; None for streams that cannot seek."""
+    if not (hasattr(stream, "seekable") and stream.seekable()):
+        return None
+    position = stream.tell()
+    _, content_hash = _copy_stream(stream, lambda chunk: None)
+    stream.seek(position)
+    return content_hash
+
+
+class GridFSBlobStore:
+    """Stores document bytes in a GridFS bucket next to the documents collection."""
+
+    name = "gridfs"
+
+    def __init__(self, db, bucket_name="document_blobs"):
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+
+    def put(self, stream, filename):
+        """Stream a file into the bucket. Returns its blob id, size and SHA-256."""
+        upload = self.bucket.open_upload_stream(filename)
+        try:
+            size, content_hash = _copy_stream(stream, upload.write)
+        except Exception:
+            upload.abort()
+            raise
+        upload.close()
+        return {"blob_id": upload._id, "size": size, "content_hash": content_hash}
+
+    def open(self, blob_id):
+        """Open a blob as a readable, chunk-streamed file object."""
+        return self.bucket.open_download_stream(ObjectId(blob_id))
+
+    @contextmanager
+    def local_path(self, blob_id, suffix=""):
+        """Stream a blob into a private temporary file and yield its path."""
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(handle, "wb") as target, self.open(blob_id) as source:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            yield path
+        finally:
+            os.remove(path)
+
+    def delete(self, blob_id):
+        try:
+            self.bucket.delete(ObjectId(blob_id))
+        except gridfs.errors.NoFile:
+            pass
+
+    def iter_blob_ids(self):
+        """Yield (blob id, upload time in UTC) for every blob in the bucket."""
+        for grid_out in self.bucket.find({}, no_cursor_timeout=True):
+            yield grid_out._id, grid_out.upload_date.replace(tzinfo=None)
+
+
+class LocalBlobStore:
+    """Stores document bytes as files under a local directory."""
+
+    name = "local"
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, str(blob_id))
+
+    def put(self, stream, filename):
+        """Stream a file to disk. Returns its blob id, size and SHA-256."""
+        blob_id = uuid.uuid4().hex
+        temp_path = self._path(f"{blob_id}.partial")
+        try:
+            with open(temp_path, "wb") as target:
+                size, content_hash = _copy_stream(stream, target.write)
+            os.replace(temp_path, self._path(blob_id))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return {"blob_id": blob_id, "size": size, "content_hash": content_hash}
+
+    def open(self, blob_id):
+        return open(self._path(blob_id), "rb")
+
+    @contextmanager
+    def local_path(self, blob_id, suffix=""):
+        """Blobs already live on disk, so no copy is needed."""
+        yield self._path(blob_id)
+
+    def delete(self, blob_id):
+        try:
+            os.remove(self._path(blob_id))
+        except FileNotFoundError:
+            pass
+
+    def iter_blob_ids(self):
+        """Yield (blob id, modification time in UTC) for every stored blob, skipping unfinished uploads."""
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith(".partial"):
+                yield entry.name, datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc).replace(tzinfo=None)
+
+
+@st.cache_resource
+def get_blob_store():
+    """
+    Return the configured blob store.
+    Configured under [storage] in secrets.toml: backend = "gridfs" (default) or "local" with local_path.
+    """
+    storage_secrets = st.secrets.get("storage", {})
+    backend = storage_secrets.get("backend", "gridfs")
+    if backend == "local":
+        return LocalBlobStore(storage_secrets.get("local_path", "document_blobs"))
+    if backend == "gridfs":
+        return GridFSBlobStore(get_database(), storage_secrets.get("bucket_name", "document_blobs"))
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -1,22 +1,65 @@
-from db_connection import get_database
+from db_connection import get_database, iter_documents, find_page
+from tracing import traced
 from bson.objectid import ObjectId
 from datetime import datetime
 
-def add_compliance_result(pointer_id, compliance_status, details):
-    """
-    Adds a compliance result linked to a specific pointer in the database.
-    """
-    db = get_database()
-    compliance_collection = db["compliance_results"]
+def _compliance_entry(pointer_id, compliance_status, details, metadata=None):
     compliance_entry = {
         "pointer_id": ObjectId(pointer_id),
         "compliance_status": compliance_status,
         "details": details,
         "checked_date": datetime.now()
     }
-    result = compliance_collection.insert_one(compliance_entry)
+    if metadata:
+        compliance_entry.update(metadata)
+    return compliance_entry
+
+@traced
+def add_compliance_result(pointer_id, compliance_status, details, metadata=None):
+    """
+    Adds a compliance result linked to a specific pointer in the database.
+    Optional metadata (e.g. cache statistics) is stored alongside the result.
+    """
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    result = compliance_collection.insert_one(
+        _compliance_entry(pointer_id, compliance_status, details, metadata)
+    )
     return str(result.inserted_id)
 
+@traced
+def add_compliance_results(results):
+    """
+    Adds several compliance results in one bulk insert.
+    Each result is a dict with pointer_id, compliance_status, details and optional metadata.
+    """
+    entries = [
+        _compliance_entry(r["pointer_id"], r["compliance_status"], r["details"], r.get("metadata"))
+        for r in results
+    ]
+    if not entries:
+        return []
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    result = compliance_collection.insert_many(entries, ordered=False)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+@traced
+def get_checked_pointer_ids(run_id):
+    """
+    Returns the ids of the pointers that already have a result from the given batch run.
+    """
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    return set(compliance_collection.distinct("pointer_id", {"run_id": run_id}))
+
+@traced
+def get_compliance_result(result_id):
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    return compliance_collection.find_one({"_id": ObjectId(result_id)})
+
+@traced
 def get_compliance_results_by_pointer(pointer_id):
     """
     Retrieves all compliance results linked to a specific pointer from the database.
@@ -26,6 +69,52 @@ def get_compliance_results_by_pointer(pointer_id):
     results = list(compliance_collection.find({"pointer_id": ObjectId(pointer_id)}))
     return results
 
+def build_compliance_filter(pointer_id=None, status=None):
+    """
+    Builds a compliance_results query for the given pointer and compliance status (None means any).
+    """
+    query = {}
+    if pointer_id is not None:
+        query["pointer_id"] = ObjectId(pointer_id)
+    if status is not None:
+        query["compliance_status"] = status
+    return query
+
+def iter_compliance_results(pointer_id=None, status=None, projection=None, sort=None, batch_size=100):
+    """
+    Streams compliance results matching the filters, newest first unless another sort is given.
+    """
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    return iter_documents(
+        compliance_collection, build_compliance_filter(pointer_id, status), projection=projection,
+        sort=sort or [("checked_date", -1)], batch_size=batch_size
+    )
+
+@traced
+def get_compliance_results_page(pointer_id=None, status=None, projection=None, descending=True, after=None, limit=20):
+    """
+    Returns one keyset-paginated page of compliance results ordered by checked_date, and the next page key.
+    """
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    return find_page(
+        compliance_collection, build_compliance_filter(pointer_id, status), projection=projection,
+        sort_field="checked_date", descending=descending, after=after, limit=limit
+    )
+
+@traced
+def get_latest_compliance_result(pointer_id, projection=None):
+    """
+    Retrieves the most recent compliance result of a pointer, or None.
+    """
+    db = get_database()
+    compliance_collection = db["compliance_results"]
+    return compliance_collection.find_one(
+        {"pointer_id": ObjectId(pointer_id)}, projection, sort=[("checked_date", -1)]
+    )
+
+@traced
 def update_compliance_result(result_id, updates):
     """
     Updates a specific compliance result in the database.
@@ -37,6 +126,7 @@ def update_compliance_result(result_id, updates):
     )
     return result.modified_count
 
+@traced
 def delete_compliance_result(result_id):
     """
     Deletes a specific compliance result from the database.
@@ -0,0 +1,633 @@
+"""
+The compliance check pipeline (OCR -> retrieval -> LLM verdict) without any Streamlit UI, shared by
+pages/3_Compliance_Analysis.py and the headless batch runner in scripts/batch_compliance.py.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import fitz
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from compliance_operations import get_latest_compliance_result
+from document_operations import get_documents_by_pointer, get_document_content_hash, document_file, read_document_data
+from llm_cache_operations import verdict_cache_key, get_cached_verdict, cache_verdict
+from image_encoding import DEFAULT_PROFILE as DEFAULT_IMAGE_PROFILE, get_profile, encode_pdf_page, encode_image_file, to_data_url
+from ocr_cache_operations import get_cached_pages, cache_pages
+from ocr_engine import extract_pages, PROMPT_VERSION as OCR_PROMPT_VERSION
+from preprocess_operations import get_document_text, save_document_text, get_query_vectors, save_query_vectors
+from prompt_builder import build_prompt_inputs, count_tokens, get_encoding
+from retrieval import build_queries, multi_query_search, split_requirements, embeddings_id
+from tracing import span, start_trace, end_trace
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+LLM_MODEL = "gpt-4o"
+# Fields of the previous compliance result a re-check needs to reuse its stages
+PREVIOUS_RESULT_PROJECTION = {"fingerprints": 1, "retrieved_chunks": 1, "compliance_status": 1, "details": 1}
+
+COMPLIANCE_PROMPT = ChatPromptTemplate.from_template(
+    """
+    You are an AI Assistant tasked with evaluating compliance based on the provided information.
+
+    **Input Details:**
+    - **Compliance Requirements**: {compliance_requirements}
+    - **Supporting Document Points**: {supporting_document_points}
+    - **Retrieved Document Context**: {formatted_chunks}
+    - **Evidence Text (extracted from the uploaded documents)**: {evidence_text}
+
+    **Your Task:**
+    1. **Supporting Document Points Verification**:
+       - Analyze the "Supporting Document Points" provided.
+       - Verify their alignment with the evidence text and the retrieved document context.
+       - Identify any gaps or missing information for each supporting point.
+
+    2. **Compliance Requirements Verification**:
+       - Evaluate the provided "Compliance Requirements."
+       - Use the retrieved document context and supporting document points for this evaluation.
+       - Determine whether the compliance requirements are fully met, partially met, or not met.
+       - Highlight which requirements or sub-requirements are not satisfied, if applicable.
+
+    3. **Provide a Compliance Status**:
+       - Based on your evaluation, assign one of the following compliance statuses:
+         - **Fully Compliant**: All supporting document points and compliance requirements are fully addressed.
+         - **Partially Compliant**: Some points or requirements are addressed, but others are incomplete or missing.
+         - **Not Compliant**: The provided documents fail to meet the supporting document points and compliance requirements.
+
+    **Output Format**:
+    - **Compliance Status**: [Fully Compliant / Partially Compliant / Not Compliant]
+    - **Reasons for Compliance Status**:
+      - Provide detailed explanations for each compliance requirement and supporting document point.
+      - For each point or requirement not met, include a reason why it was not satisfied.
+      - Sub-requirement Analysis (if applicable):
+        - Sub-requirement A: [Met/Not Met] - Explanation
+        - Sub-requirement B: [Met/Not Met] - Explanation
+        - Sub-requirement C: [Met/Not Met] - Explanation
+    """
+)
+
+
+def load_settings(secrets):
+    """
+    Read the pipeline settings from the [ocr] and [retrieval] sections of secrets.toml
+    (st.secrets or any mapping with the same layout).
+    """
+    ocr_config = secrets.get("ocr", {})
+    retrieval_config = secrets.get("retrieval", {})
+    preprocessing_config = secrets.get("preprocessing", {})
+    llm_cache_config = secrets.get("llm_cache", {})
+    prompt_config = secrets.get("prompt", {})
+    return {
+        # OCR concurrency and rate limits
+        "ocr": {
+            "model": ocr_config.get("model", "gpt-4o-mini"),
+            "max_workers": int(ocr_config.get("max_workers", 4)),
+            "requests_per_minute": ocr_config.get("requests_per_minute"),
+            "tokens_per_minute": ocr_config.get("tokens_per_minute"),
+            "max_retries": int(ocr_config.get("max_retries", 5)),
+        },
+        "ocr_cache_max_bytes": int(ocr_config.get("cache_max_mb", 512)) * 1024 * 1024,
+        # Whole-document texts reused by later checks, evicted least recently used first
+        "document_text_max_bytes": int(ocr_config.get("text_cache_max_mb", 256)) * 1024 * 1024,
+        # Query unit vectors embedded at upload, evicted the same way
+        "query_vectors_max_bytes": int(preprocessing_config.get("embeddings_max_mb", 512)) * 1024 * 1024,
+        # Pages whose text layer has at least this many letters are read natively instead of OCR'd
+        "min_native_text_chars": int(ocr_config.get("min_native_text_chars", 40)),
+        # Pages at least this much covered by images are scans (perhaps with a digital header) and OCR'd
+        "max_native_image_coverage": float(ocr_config.get("max_native_image_coverage", 0.6)),
+        # Page image encoding (DPI, grayscale, format, quality, size ceiling), see image_encoding.ENCODING_PROFILES
+        "image_profile": get_profile(
+            ocr_config.get("image_profile", DEFAULT_IMAGE_PROFILE),
+            format=ocr_config.get("image_format"),
+            quality=ocr_config.get("image_quality"),
+            grayscale=ocr_config.get("image_grayscale"),
+            max_bytes=ocr_config.get("image_max_bytes"),
+        ),
+        # Multi-query retrieval
+        "retrieval": {
+            "query_chars": int(retrieval_config.get("query_chars", 1500)),
+            "max_queries": int(retrieval_config.get("max_queries", 48)),
+            "k_per_query": int(retrieval_config.get("k_per_query", 5)),
+            "top_k": int(retrieval_config.get("top_k", 8)),
+        },
+        # Token budget of the compliance prompt, see prompt_builder.build_prompt_inputs
+        "prompt": {
+            "max_tokens": int(prompt_config.get("max_tokens", 24000)),
+            "chunk_share": float(prompt_config.get("chunk_share", 0.6)),
+        },
+        # LLM verdict cache; enabled = false turns it off entirely
+        "llm_cache": {
+            "enabled": bool(llm_cache_config.get("enabled", True)),
+            "ttl_days": float(llm_cache_config.get("ttl_days", 30)),
+            "max_bytes": int(llm_cache_config.get("max_mb", 64)) * 1024 * 1024,
+        },
+    }
+
+
+def image_coverage(page):
+    """Share of a PDF page's area covered by images (overlaps counted twice, capped at 1)."""
+    page_area = page.rect.get_area()
+    if not page_area:
+        return 0.0
+    covered = sum((fitz.Rect(info["bbox"]) & page.rect).get_area() for info in page.get_image_info())
+    return min(covered / page_area, 1.0)
+
+
+def extract_native_text(page, min_chars, max_image_coverage=1.0):
+    """
+    Return the text layer of a PDF page if it is usable, otherwise None.
+    A page is considered scanned when it has too few letters (any script, Arabic included),
+    when most of its glyphs could not be mapped to Unicode, or when images cover at least
+    max_image_coverage of it: a scan stamped with a digital header or footer has enough letters
+    but its body is only in the image.
+    """
+    if max_image_coverage < 1.0 and image_coverage(page) >= max_image_coverage:
+        return None
+    text = page.get_text("text", sort=True).strip()
+    letters = sum(c.isalpha() for c in text)
+    unmapped = text.count("\ufffd")
+    if letters < min_chars or unmapped > letters:
+        return None
+    return text
+
+
+def convert_pdf_to_images(pdf, page_numbers, profile, errors):
+    """
+    Rasterize the given 1-based pages of an open PDF in memory using an encoding profile.
+    Yields (page number, data URL) pairs one page at a time so only pages in flight are held in memory.
+    A page that cannot be rendered or encoded is reported in errors and skipped, so the pages
+    already sent to the vision model are not lost.
+    """
+    for page_number in page_numbers:
+        try:
+            with span("ocr.rasterize") as attributes:
+                page = pdf.load_page(page_number - 1)
+                image_bytes, mime_type = encode_pdf_page(page, profile)
+                attributes["bytes"] = len(image_bytes)
+        except Exception as e:
+            errors.append(f"Error rendering page {page_number}: {e}")
+            continue
+        yield page_number, to_data_url(image_bytes, mime_type)
+
+
+def extract_text_with_openai_vision(page_images, client, settings, errors):
+    """
+    Extract text from (page number, image data URL) pairs concurrently using OpenAI Vision.
+    Failed pages are reported in errors without dropping the rest of the document. Pages read
+    successfully are returned even when empty (e.g. blank pages), so they are cached and not
+    sent to the vision model again.
+    """
+    results = extract_pages(client, page_images, **settings["ocr"])
+    for result in results:
+        if result["error"]:
+            errors.append(f"Error processing page {result['page']}: {result['error']}")
+    return {result["page"]: result["text"] for result in results if not result["error"]}
+
+
+def ocr_document_pages(doc, client, settings, cache_stats, errors):
+    """
+    Extract the text of every page of one document.
+    PDFs are opened from the blob store without loading them into memory; pages with a usable
+    text layer skip rasterization and the API, scanned pages are served from the OCR cache or
+    rendered in memory and streamed to the vision model.
+    Returns a dict mapping page number to text.
+    """
+    extension = os.path.splitext(doc["document_name"].lower())[1]
+    content_hash = get_document_content_hash(doc)
+    model = settings["ocr"]["model"]
+
+    # Handle PDFs
+    if extension == ".pdf":
+        with document_file(doc) as pdf_path, fitz.open(pdf_path) as pdf:
+            native_texts = {}
+            scanned_pages = []
+            with span("ocr.native_text", pages=len(pdf)):
+                for page in pdf:
+                    text = extract_native_text(page, settings["min_native_text_chars"], settings["max_native_image_coverage"])
+                    if text is None:
+                        scanned_pages.append(page.number + 1)
+                    else:
+                        native_texts[page.number + 1] = text
+
+            page_texts = get_cached_pages(content_hash, scanned_pages, model, OCR_PROMPT_VERSION)
+            missing_pages = [page for page in scanned_pages if page not in page_texts]
+            new_texts = {}
+            if missing_pages:
+                page_images = convert_pdf_to_images(pdf, missing_pages, settings["image_profile"], errors)
+                new_texts = extract_text_with_openai_vision(page_images, client, settings, errors)
+
+    # Handle images
+    elif extension in IMAGE_EXTENSIONS:
+        native_texts = {}
+        page_texts = get_cached_pages(content_hash, [1], model, OCR_PROMPT_VERSION)
+        missing_pages = [] if page_texts else [1]
+        new_texts = {}
+        if missing_pages:
+            with span("ocr.rasterize"):
+                page_image = (1, to_data_url(*encode_image_file(read_document_data(doc), settings["image_profile"])))
+            new_texts = extract_text_with_openai_vision([page_image], client, settings, errors)
+
+    else:
+        raise ValueError(f"Unsupported file format: {doc['document_name']}")
+
+    cache_pages(content_hash, new_texts, model, OCR_PROMPT_VERSION, settings["ocr_cache_max_bytes"])
+    cache_stats["hits"] += len(page_texts)
+    cache_stats["misses"] += len(missing_pages)
+    cache_stats["native"] += len(native_texts)
+    page_texts.update(new_texts)
+    page_texts.update(native_texts)
+    return page_texts
+
+
+def _no_stage(name):
+    return nullcontext()
+
+
+def join_page_texts(page_texts):
+    return "\n".join(page_texts[page] for page in sorted(page_texts) if page_texts[page])
+
+
+def process_documents_with_vision(documents, client, settings, errors):
+    """
+    Process uploaded documents, using OpenAI Vision only for scanned pages. Documents whose text
+    was extracted before (at upload or by an earlier check) are not opened at all; newly extracted
+    text is stored so the next check of any pointer with the same file reuses it.
+    The same file attached more than once is read once.
+    Returns the combined text and the native/cache hit/miss page counts (plus the numbers of
+    preprocessed and duplicate documents, and the names of the documents extracted again);
+    per-document failures are appended to errors.
+    """
+    texts = []
+    cache_stats = {"hits": 0, "misses": 0, "native": 0, "preprocessed": 0, "duplicates": 0, "extracted": []}
+    model = settings["ocr"]["model"]
+    seen_hashes = set()
+    with span("ocr", documents=len(documents)):
+        for doc in documents:
+            if doc.get("content_hash") and doc["content_hash"] in seen_hashes:
+                cache_stats["duplicates"] += 1
+                continue
+            seen_hashes.add(doc.get("content_hash"))
+            stored = get_document_text(doc["content_hash"], model, OCR_PROMPT_VERSION) if doc.get("content_hash") else None
+            if stored is not None:
+                texts.append(stored["text"])
+                cache_stats["preprocessed"] += 1
+                continue
+            cache_stats["extracted"].append(doc["document_name"])
+            try:
+                errors_before = len(errors)
+                page_texts = ocr_document_pages(doc, client, settings, cache_stats, errors)
+                texts.append(join_page_texts(page_texts))
+                if doc.get("content_hash") and len(errors) == errors_before:
+                    save_document_text(
+                        doc["content_hash"], texts[-1], len(page_texts), model, OCR_PROMPT_VERSION,
+                        settings["document_text_max_bytes"]
+                    )
+            except Exception as e:
+                errors.append(f"Error processing document {doc['document_name']}: {e}")
+
+    # A blank line between documents keeps query units from spanning two of them, so the units
+    # match the ones embedded per document at upload time
+    return "\n\n".join(texts), cache_stats
+
+
+def sampled_evidence_units(text, requirements, settings):
+    """
+    The evidence units of a document that a check of it can use: build_queries samples at most
+    max_queries units (requirements first), so only those are worth embedding ahead of time.
+    Exact for pointers with one document; with several, the check samples their joined text.
+    """
+    retrieval = settings["retrieval"]
+    requirement_units = set(split_requirements(requirements, retrieval["query_chars"]))
+    return [
+        unit for unit in build_queries(text, requirements, retrieval["query_chars"], retrieval["max_queries"])
+        if unit not in requirement_units
+    ]
+
+
+def preprocess_document(doc, client, vector_store, settings, stage=_no_stage, requirements=""):
+    """
+    Extract a document's text and embed the query units a check can sample from it ahead of any
+    compliance check, storing both under its content hash. vector_store gives the embedding model
+    of the index the document will be checked against; with None only the text is stored.
+    requirements are those of the document's pointer, which decide how many evidence units a check
+    samples. Raises if any page failed, so a partial text is never stored. Returns the number of
+    pages and of embedded query units.
+    """
+    content_hash = get_document_content_hash(doc)
+    model = settings["ocr"]["model"]
+    with stage("ocr"):
+        stored = get_document_text(content_hash, model, OCR_PROMPT_VERSION)
+        if stored is None:
+            errors = []
+            cache_stats = {"hits": 0, "misses": 0, "native": 0}
+            page_texts = ocr_document_pages(doc, client, settings, cache_stats, errors)
+            if errors:
+                raise RuntimeError("; ".join(errors))
+            stored = {"text": join_page_texts(page_texts), "pages": len(page_texts)}
+            save_document_text(
+                content_hash, stored["text"], stored["pages"], model, OCR_PROMPT_VERSION,
+                settings["document_text_max_bytes"]
+            )
+
+    units = []
+    if vector_store is not None:
+        with stage("embedding"):
+            key = embeddings_id(vector_store.embeddings)
+            query_chars = settings["retrieval"]["query_chars"]
+            units = sampled_evidence_units(stored["text"], requirements, settings)
+            known = get_query_vectors([content_hash], key, query_chars)
+            missing = [unit for unit in units if unit not in known]
+            if missing:
+                with span("retrieval.embed", queries=len(missing)):
+                    vectors = vector_store.embeddings.embed_documents(missing)
+                save_query_vectors(content_hash, key, query_chars, missing, vectors, settings["query_vectors_max_bytes"])
+    return {"pages": stored["pages"], "query_units": len(units)}
+
+
+def precomputed_query_vectors(documents, vector_store, settings):
+    """Query unit vectors embedded at upload time for these documents and this index's embedding model."""
+    content_hashes = [doc["content_hash"] for doc in documents if doc.get("content_hash")]
+    return get_query_vectors(content_hashes, embeddings_id(vector_store.embeddings), settings["retrieval"]["query_chars"])
+
+
+def retrieve_with_scores(evidence_text, requirements, vector_store, settings, known_vectors=None):
+    """
+    Retrieve regulation chunks for the evidence text and the compliance requirements.
+    Both are split into query units, embedded in one batch (skipping those in known_vectors)
+    and searched in one FAISS call.
+    """
+    retrieval_settings = settings["retrieval"]
+    with span("retrieval"):
+        queries = build_queries(
+            evidence_text, requirements,
+            max_chars=retrieval_settings["query_chars"], max_queries=retrieval_settings["max_queries"]
+        )
+        return multi_query_search(
+            vector_store, queries,
+            k_per_query=retrieval_settings["k_per_query"], top_k=retrieval_settings["top_k"],
+            known_vectors=known_vectors
+        )
+
+
+def stage_fingerprint(*parts):
+    """SHA-256 over the inputs of a pipeline stage; a re-check with the same fingerprint can reuse the stage's output."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def previous_result(pointer_id):
+    """The fingerprints and stage outputs of the pointer's latest compliance result, or an empty dict."""
+    return get_latest_compliance_result(pointer_id, PREVIOUS_RESULT_PROJECTION) or {}
+
+
+def document_hashes(documents):
+    """Content hashes of the documents (ids for documents stored without one), sorted and deduplicated."""
+    return sorted({doc.get("content_hash") or str(doc["_id"]) for doc in documents})
+
+
+def retrieve_or_reuse(pointer, evidence_text, documents, vector_store, index_version, previous, settings):
+    """
+    The retrieval step of a check. When the evidence text, the requirements, the index version and
+    the retrieval settings are those of the previous result, its chunks are returned without
+    embedding or searching anything. index_version must be the version vector_store was loaded
+    from (see VectorStoreRegistry.get_with_version). Returns (relevant chunks, fingerprint, True if reused).
+    """
+    fingerprint = stage_fingerprint(
+        evidence_text, pointer["compliance_requirements"], index_version,
+        embeddings_id(vector_store.embeddings), settings["retrieval"]
+    )
+    if index_version is not None and previous.get("fingerprints", {}).get("retrieval") == fingerprint \
+            and "retrieved_chunks" in previous:
+        return previous["retrieved_chunks"], fingerprint, True
+    chunks = filter_relevant_chunks(retrieve_with_scores(
+        evidence_text, pointer["compliance_requirements"], vector_store, settings,
+        known_vectors=precomputed_query_vectors(documents, vector_store, settings)
+    ))
+    return chunks, fingerprint, False
+
+
+def stage_metadata(documents, ocr_cache_stats, chunks, retrieval_fingerprint, retrieval_reused, llm_metadata, settings):
+    """
+    What to store on the compliance result so the next re-check can tell which stages' inputs
+    changed: the fingerprint of each stage, the retrieved chunks and the stages reused this time.
+    OCR is reused per document, so ocr_reuse also records how many of the documents' texts were
+    reused and which documents were extracted again when only some were.
+    """
+    unique_documents = len(documents) - ocr_cache_stats["duplicates"]
+    reused_stages = []
+    if unique_documents and ocr_cache_stats["preprocessed"] == unique_documents:
+        reused_stages.append("ocr")
+    if retrieval_reused:
+        reused_stages.append("retrieval")
+    if llm_metadata["llm_cache"]["hit"]:
+        reused_stages.append("llm")
+    hashes = document_hashes(documents)
+    return {
+        "fingerprints": {
+            "documents": hashes,
+            "ocr": stage_fingerprint(hashes, settings["ocr"]["model"], OCR_PROMPT_VERSION),
+            "retrieval": retrieval_fingerprint,
+            "llm": llm_metadata["llm_cache"]["key"],
+        },
+        "retrieved_chunks": chunks,
+        "reused_stages": reused_stages,
+        "ocr_reuse": {
+            "documents": unique_documents,
+            "reused": ocr_cache_stats["preprocessed"],
+            "extracted": ocr_cache_stats["extracted"],
+        },
+    }
+
+
+def filter_relevant_chunks(chunks):
+    """Filter out irrelevant chunks based on content quality."""
+    relevant_chunks = []
+    for chunk in chunks:
+        content = chunk.get("content", "").strip()
+        if len(content.split()) >= 5 and sum(c.isalpha() for c in content) / len(content) > 0.5:
+            relevant_chunks.append(chunk)
+    return relevant_chunks
+
+
+def format_chunk(chunk):
+    return f"Score: {chunk['score']}\nContent: {chunk['content']}"
+
+
+def build_chain(llm):
+    return COMPLIANCE_PROMPT | llm | StrOutputParser()
+
+
+def prompt_inputs(pointer, chunks, evidence_text, settings):
+    """
+    Fill the compliance prompt within the configured token budget. Chunks are taken best first.
+    Returns (template variables, token breakdown per section).
+    """
+    return build_prompt_inputs(
+        COMPLIANCE_PROMPT,
+        {
+            "compliance_requirements": pointer["compliance_requirements"],
+            "supporting_document_points": pointer.get("supporting_document_points", "No supporting points provided."),
+        },
+        chunks, evidence_text, format_chunk,
+        max_prompt_tokens=settings["prompt"]["max_tokens"], chunk_share=settings["prompt"]["chunk_share"]
+    )
+
+
+def parse_status_line(line):
+    """Extract the compliance status from the first line of the model output."""
+    return line.split(":")[-1].strip()
+
+
+def parse_llm_response(llm_response):
+    """Split the model output into the compliance status (first line) and the reasons."""
+    lines = llm_response.strip().split("\n")
+    return parse_status_line(lines[0]), "\n".join(lines[1:]).strip()
+
+
+def stream_chain(chain, inputs, outcome):
+    """
+    Yield the model output piece by piece. outcome["status"] is set as soon as the first line is
+    complete; once the stream ends outcome holds the full "text" and "llm_timing" with the
+    time to first token and the total generation time in seconds.
+    """
+    start = time.perf_counter()
+    ttft = None
+    text = ""
+    for piece in chain.stream(inputs):
+        if not piece:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        text += piece
+        if "status" not in outcome and "\n" in text.lstrip():
+            outcome["status"] = parse_status_line(text.lstrip().split("\n", 1)[0])
+        yield piece
+    outcome["text"] = text
+    outcome["llm_timing"] = {"ttft_seconds": ttft, "generation_seconds": time.perf_counter() - start}
+
+
+def stream_compliance_verdict(pointer, chunks, evidence_text, llm, settings, outcome, bypass_cache=False, previous=None):
+    """
+    Ask the LLM for a verdict on the retrieved chunks and the evidence text, yielding the answer as
+    it streams. If the previous result (see previous_result) was given for an identical rendered
+    prompt, model and temperature, or a cached response exists for them, that verdict is yielded
+    whole instead; bypass_cache skips both but still stores the fresh response, and with the cache
+    disabled ([llm_cache] enabled = false) every verdict comes from the model.
+    When the generator is exhausted, outcome holds "status", "reasons" and "metadata" for the
+    compliance result (cache use, prompt tokens and timings).
+    """
+    with span("prompt.build"):
+        inputs, prompt_tokens = prompt_inputs(pointer, chunks, evidence_text, settings)
+    cache_settings = settings["llm_cache"]
+    key = verdict_cache_key(COMPLIANCE_PROMPT.format(**inputs), llm.model_name, llm.temperature)
+
+    llm_response, source = None, None
+    reuse = cache_settings["enabled"] and not bypass_cache
+    if reuse and previous and previous.get("fingerprints", {}).get("llm") == key:
+        llm_response = f"**Compliance Status**: {previous['compliance_status']}\n{previous['details']}"
+        source = "previous_result"
+    elif reuse:
+        llm_response = get_cached_verdict(key)
+        source = "cache" if llm_response is not None else None
+    cache_info = {"key": key, "hit": llm_response is not None, "bypassed": bypass_cache, "source": source}
+
+    if llm_response is None:
+        with span("llm") as attributes:
+            yield from stream_chain(build_chain(llm), inputs, outcome)
+            llm_response = outcome["text"]
+            attributes.update(
+                prompt_tokens=prompt_tokens["total"],
+                completion_tokens=count_tokens(llm_response, get_encoding())
+            )
+        if cache_settings["enabled"]:
+            cache_verdict(
+                key, llm.model_name, llm.temperature, llm_response,
+                cache_settings["ttl_days"], cache_settings["max_bytes"]
+            )
+    else:
+        outcome["llm_timing"] = {"ttft_seconds": None, "generation_seconds": None}
+        yield llm_response
+
+    outcome["status"], outcome["reasons"] = parse_llm_response(llm_response)
+    outcome["metadata"] = {
+        "llm_cache": cache_info, "prompt_tokens": prompt_tokens, "llm_timing": outcome["llm_timing"]
+    }
+
+
+def evaluate_compliance(pointer, chunks, evidence_text, llm, settings, bypass_cache=False, on_chunk=None, previous=None):
+    """
+    Run stream_compliance_verdict to completion, passing each piece of output to on_chunk if given.
+    Returns (compliance status, reasons, metadata for the compliance result).
+    """
+    outcome = {}
+    for piece in stream_compliance_verdict(pointer, chunks, evidence_text, llm, settings, outcome, bypass_cache, previous):
+        if on_chunk:
+            on_chunk(piece)
+    return outcome["status"], outcome["reasons"], outcome["metadata"]
+
+
+def check_pointer(pointer, client, llm, registry, settings, stage=_no_stage, bypass_cache=False, on_chunk=None):
+    """
+    Run stream_check_pointer to completion, passing the verdict text to on_chunk as it streams.
+    Returns the result to store (pointer_id, compliance_status, details, metadata), or raises with the
+    reason the pointer could not be checked.
+    """
+    outcome = {}
+    for piece in stream_check_pointer(pointer, client, llm, registry, settings, outcome, stage, bypass_cache):
+        if on_chunk:
+            on_chunk(piece)
+    return outcome["result"]
+
+
+def stream_check_pointer(pointer, client, llm, registry, settings, outcome, stage=_no_stage, bypass_cache=False):
+    """
+    Run one pointer through OCR, retrieval and the LLM verdict, yielding the verdict as it streams.
+    stage(name) must return a context manager entered around the "ocr", "retrieval" and "llm" steps,
+    e.g. to hold a per-stage concurrency slot or to report progress.
+    Stages whose inputs match the fingerprints of the pointer's previous result are reused rather than
+    recomputed; the metadata records the new fingerprints and which stages were reused.
+    outcome["status"] is set as soon as the verdict's status line has arrived; when the generator is
+    exhausted outcome["result"] holds the result to store (pointer_id, compliance_status, details,
+    metadata). Raises with the reason the pointer could not be checked.
+    """
+    errors = []
+    trace = start_trace()
+    # A failed or abandoned check must not leave its trace active: the worker loop would record
+    # every later @traced call into it
+    try:
+        previous = previous_result(pointer["_id"])
+        with stage("ocr"):
+            documents = get_documents_by_pointer(pointer["_id"])
+            if not documents:
+                raise ValueError("no documents uploaded")
+            text_data, ocr_cache_stats = process_documents_with_vision(documents, client, settings, errors)
+
+        with stage("retrieval"):
+            vector_store, index_version = registry.get_with_version(pointer.get("year"), pointer["language"])
+            if vector_store is None:
+                raise ValueError(f"no vector store for {pointer.get('year')} {pointer['language']}")
+            chunks, retrieval_fingerprint, retrieval_reused = retrieve_or_reuse(
+                pointer, text_data, documents, vector_store, index_version, previous, settings
+            )
+
+        with stage("llm"):
+            yield from stream_compliance_verdict(pointer, chunks, text_data, llm, settings, outcome, bypass_cache, previous)
+            llm_metadata = outcome["metadata"]
+    finally:
+        trace_summary = end_trace(trace)
+
+    outcome["result"] = {
+        "pointer_id": pointer["_id"],
+        "compliance_status": outcome["status"],
+        "details": outcome["reasons"],
+        "metadata": {
+            "ocr_cache": ocr_cache_stats, "ocr_errors": errors, **llm_metadata,
+            **stage_metadata(documents, ocr_cache_stats, chunks, retrieval_fingerprint, retrieval_reused, llm_metadata, settings),
+            "trace": trace_summary,
+        },
+    }
@@ -1,31 +1,260 @@
 import pymongo
 import streamlit as st
+from bson.objectid import ObjectId
+
+# Database used instead of the configured one, e.g. by benchmarks running against a scratch database
+_database_override = None
+
+def use_database(db):
+    """
+    Route all *_operations calls to the given database; pass None to go back to the configured one.
+    """
+    global _database_override
+    _database_override = db
 
-@st.cache_resource
 def get_database():
+    """
+    Return the database used by the *_operations modules.
+    """
+    if _database_override is not None:
+        return _database_override
+    return _connect()
+
+# Indexes backing the hot queries of the *_operations modules, created at startup
+INDEXES = {
+    "pointers": [
+        ([("year", pymongo.ASCENDING)], {}),
+        ([("compliance_status", pymongo.ASCENDING)], {}),
+    ],
+    "documents": [
+        ([("pointer_id", pymongo.ASCENDING)], {}),
+        ([("content_hash", pymongo.ASCENDING)], {}),
+    ],
+    "compliance_results": [
+        ([("pointer_id", pymongo.ASCENDING), ("checked_date", pymongo.DESCENDING)], {}),
+        # Listings across all pointers (metrics reports, results pages) stream newest first
+        ([("checked_date", pymongo.DESCENDING)], {}),
+        # Batch runs look up the pointers they have already checked when resuming
+        ([("run_id", pymongo.ASCENDING)], {"sparse": True}),
+    ],
+    "ocr_cache": [
+        ([("last_used", pymongo.ASCENDING)], {}),
+    ],
+    "llm_cache": [
+        # Entries are removed by MongoDB once their expires_at has passed
+        ([("expires_at", pymongo.ASCENDING)], {"expireAfterSeconds": 0}),
+        ([("last_used", pymongo.ASCENDING)], {}),
+    ],
+    "document_text": [
+        ([("last_used", pymongo.ASCENDING)], {}),
+    ],
+    "document_embeddings": [
+        ([("content_hash", pymongo.ASCENDING)], {}),
+        ([("last_used", pymongo.ASCENDING)], {}),
+    ],
+    "compliance_jobs": [
+        # At most one queued or running job per pointer; finished jobs drop active_key
+        ([("active_key", pymongo.ASCENDING)], {"unique": True, "sparse": True}),
+        ([("status", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)], {}),
+        ([("pointer_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], {}),
+    ],
+}
+
+# Running byte totals of the size-capped caches (ocr_cache, llm_cache, document_text,
+# document_embeddings), so a cache write does not have to sum the whole collection
+CACHE_SIZES_COLLECTION = "cache_sizes"
+
+def _collection_bytes(collection):
+    totals = list(collection.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]))
+    return totals[0]["size"] if totals else 0
+
+def record_cache_write(db, collection_name, size_delta, max_bytes):
+    """
+    Adds size_delta to the running byte total of a size-capped cache collection and, once the
+    total crosses max_bytes, evicts its least recently used entries. Entries must carry "size"
+    and "last_used" fields. Returns the number of evicted entries.
+    """
+    sizes = db[CACHE_SIZES_COLLECTION]
+    entry = sizes.find_one_and_update(
+        {"_id": collection_name}, {"$inc": {"bytes": size_delta}}, return_document=pymongo.ReturnDocument.AFTER
+    )
+    if entry is None:
+        # No total yet (new deployment or first write since totals were kept): start from the real one
+        total = _collection_bytes(db[collection_name])
+        sizes.update_one({"_id": collection_name}, {"$set": {"bytes": total}}, upsert=True)
+    else:
+        total = entry["bytes"]
+    if total <= max_bytes:
+        return 0
+    return evict_least_recently_used(db, collection_name, max_bytes)
+
+def evict_least_recently_used(db, collection_name, max_bytes):
+    """
+    Deletes the least recently used entries of a cache collection until the rest fit in max_bytes,
+    and resets its running total. Returns the number of evicted entries.
+    """
+    collection = db[collection_name]
+    # Recounted here because the running total also includes entries removed without going
+    # through it (TTL expiry, sweeps), which only ever makes it an overestimate
+    total = _collection_bytes(collection)
+    excess = total - max_bytes
+    evicted_ids = []
+    if excess > 0:
+        for entry in collection.find({}, {"size": 1}).sort("last_used", 1):
+            evicted_ids.append(entry["_id"])
+            # Entries written before sizes were recorded count as empty
+            total -= entry.get("size", 0)
+            excess -= entry.get("size", 0)
+            if excess <= 0:
+                break
+    deleted = collection.delete_many({"_id": {"$in": evicted_ids}}).deleted_count if evicted_ids else 0
+    db[CACHE_SIZES_COLLECTION].update_one({"_id": collection_name}, {"$set": {"bytes": total}}, upsert=True)
+    return deleted
+
+# Client settings read from [mongo] in secrets.toml, mapped to MongoClient keyword arguments
+CLIENT_OPTIONS = {
+    "max_pool_size": ("maxPoolSize", int),
+    "min_pool_size": ("minPoolSize", int),
+    "max_idle_time_ms": ("maxIdleTimeMS", int),
+    "connect_timeout_ms": ("connectTimeoutMS", int),
+    "socket_timeout_ms": ("socketTimeoutMS", int),
+    "server_selection_timeout_ms": ("serverSelectionTimeoutMS", int),
+    "write_concern": ("w", lambda value: int(value) if str(value).isdigit() else str(value)),
+    "journal": ("journal", bool),
+    "retry_writes": ("retryWrites", bool),
+}
+
+def _client_options(mongo_secrets):
+    return {
+        option: convert(mongo_secrets[key])
+        for key, (option, convert) in CLIENT_OPTIONS.items()
+        if key in mongo_secrets
+    }
+
+def ensure_indexes(db):
+    """
+    Creates the indexes in INDEXES if they do not exist yet.
+    """
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            db[collection_name].create_index(keys, **options)
+
+def _hot_queries(db):
+    """
+    The queries issued on every page load or compliance check, as cursors to explain.
+    """
+    sample_id = ObjectId()
+    return {
+        "documents by pointer_id": db["documents"].find({"pointer_id": sample_id}),
+        "documents by content_hash": db["documents"].find({"content_hash": ""}),
+        "compliance_results by pointer_id, newest first": db["compliance_results"].find(
+            {"pointer_id": sample_id}).sort("checked_date", pymongo.DESCENDING),
+        "compliance_results newest first": db["compliance_results"].find().sort("checked_date", pymongo.DESCENDING),
+        "pointers by year": db["pointers"].find({"year": {"$in": [2024, "2024"]}}),
+        "pointers by compliance_status": db["pointers"].find({"compliance_status": "Not Checked"}),
+    }
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def verify_query_plans(db):
+    """
+    Explains every hot query and raises RuntimeError if any of them would scan a whole collection.
+    """
+    collection_scans = []
+    for name, cursor in _hot_queries(db).items():
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collection_scans.append(name)
+    if collection_scans:
+        raise RuntimeError(
+            "These queries are not using an index (COLLSCAN): " + ", ".join(collection_scans)
+            + ". Check INDEXES in db_connection.py and the [mongo] provision_indexes setting."
+        )
+
+@st.cache_resource
+def _connect():
     """
     Establish a MongoDB connection based on Streamlit secrets.
     Supports both local and cloud (MongoDB Atlas) connections.
+    Pool size, timeouts and write concern come from the same [mongo] section, and the
+    indexes in INDEXES are provisioned and checked before the database is handed out.
     """
     try:
         mongo_secrets = st.secrets["mongo"]
+        client_options = _client_options(mongo_secrets)
 
         # Determine the connection method: Cloud URI or Local
         if "cloud_uri" in mongo_secrets:
             # Connect using MongoDB Atlas cloud URI
-            client = pymongo.MongoClient(mongo_secrets["cloud_uri"])
+            client = pymongo.MongoClient(mongo_secrets["cloud_uri"], **client_options)
         else:
             # Connect using local host and port
             client = pymongo.MongoClient(
                 host=mongo_secrets.get("host", "localhost"),
                 port=int(mongo_secrets.get("port", 27017)),
                 username=mongo_secrets.get("username"),
-                password=mongo_secrets.get("password")
+                password=mongo_secrets.get("password"),
+                **client_options
             )
 
-        # Access and return the specified database
-        return client[mongo_secrets["db_name"]]
+        # Access the specified database
+        db = client[mongo_secrets["db_name"]]
+        if mongo_secrets.get("provision_indexes", True):
+            ensure_indexes(db)
 
     except Exception as e:
         st.error(f"Error connecting to the database: {e}")
         return None
+
+    # Deliberately outside the try block: a hot query without an index must stop the app
+    if mongo_secrets.get("verify_query_plans", True):
+        verify_query_plans(db)
+    return db
+
+def iter_documents(collection, query=None, projection=None, sort=None, limit=0, batch_size=100):
+    """
+    Yields matching documents one at a time, fetching batch_size documents per round trip,
+    so large result sets are streamed instead of materialized.
+    """
+    cursor = collection.find(query or {}, projection, sort=sort, limit=limit, batch_size=batch_size)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+def find_page(collection, query=None, projection=None, sort_field="_id", descending=False, after=None, limit=20):
+    """
+    Keyset pagination over a collection, ordered by sort_field with _id as tie-breaker.
+    Pass the returned next_key as `after` to fetch the following page; next_key is None on the last page.
+    Returns (documents, next_key).
+    """
+    query = dict(query or {})
+    direction = pymongo.DESCENDING if descending else pymongo.ASCENDING
+    operator = "$lt" if descending else "$gt"
+    if after is not None:
+        if sort_field == "_id":
+            query["_id"] = {operator: after}
+        else:
+            last_value, last_id = after
+            query = {"$and": [query, {"$or": [
+                {sort_field: {operator: last_value}},
+                {sort_field: last_value, "_id": {operator: last_id}}
+            ]}]}
+
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    if projection is not None and sort_field != "_id" and isinstance(projection, dict) and 1 in projection.values():
+        projection = {**projection, sort_field: 1}
+    documents = list(collection.find(query, projection, sort=sort, limit=limit + 1))
+
+    next_key = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_key = last["_id"] if sort_field == "_id" else (last.get(sort_field), last["_id"])
+    return documents, next_key
@@ -1,31 +1,181 @@
-from db_connection import get_database
+from db_connection import get_database, iter_documents, find_page
+from tracing import traced
+from blob_store import get_blob_store, hash_seekable_stream
+from blob_operations import acquire_blob, register_blob, release_blob, get_blob
 from bson.objectid import ObjectId
+from contextlib import contextmanager
 from datetime import datetime
+import hashlib
+import io
+import os
+import tempfile
 
+# Documents carry only metadata; their bytes live in the blob store
+METADATA_PROJECTION = {"document_data": 0}
+
+def store_blob(stream, document_name):
+    """
+    Returns the blob entry holding a reference for this content, storing the bytes only if no
+    blob with the same SHA-256 exists. Seekable streams are hashed first so duplicates are never
+    written; other streams are written and the copy is dropped if it turns out to be a duplicate.
+    """
+    blob_store = get_blob_store()
+    content_hash = hash_seekable_stream(stream)
+    if content_hash is not None:
+        blob = acquire_blob(content_hash)
+        if blob is not None:
+            return blob
+    stored = blob_store.put(stream, document_name)
+    blob = register_blob(stored["content_hash"], blob_store.name, stored["blob_id"], stored["size"])
+    if blob["blob_id"] != stored["blob_id"]:
+        blob_store.delete(stored["blob_id"])
+    return blob
+
+def _free_blob(document):
+    """
+    Drops a deleted document's reference on its blob and deletes the bytes once nothing refers to them.
+    """
+    if "blob_id" not in document:
+        return
+    blob = get_blob(document["content_hash"]) if document.get("content_hash") else None
+    if blob is None or blob["blob_id"] != document["blob_id"]:
+        # Stored before blobs were shared and not compacted yet: the document owns its blob
+        get_blob_store().delete(document["blob_id"])
+        return
+    unreferenced = release_blob(document["content_hash"])
+    if unreferenced is not None:
+        get_blob_store().delete(unreferenced["blob_id"])
+
+@traced
 def add_document(pointer_id, document_name, document_data):
     """
     Adds a document linked to a specific pointer in the database.
+    document_data may be bytes or a readable file object; it is streamed to the blob store in chunks,
+    unless a blob with the same content is already stored, which is then shared.
     """
     db = get_database()
     documents_collection = db["documents"]
+    if isinstance(document_data, (bytes, bytearray)):
+        document_data = io.BytesIO(document_data)
+    blob = store_blob(document_data, document_name)
     document_entry = {
         "pointer_id": ObjectId(pointer_id),
         "document_name": document_name,
-        "document_data": document_data,
+        "storage": blob["storage"],
+        "blob_id": blob["blob_id"],
+        "size": blob["size"],
+        "content_hash": blob["_id"],
         "upload_date": datetime.now()
     }
     result = documents_collection.insert_one(document_entry)
     return str(result.inserted_id)
 
+@traced
 def get_documents_by_pointer(pointer_id):
     """
-    Retrieves all documents linked to a specific pointer from the database.
+    Retrieves the metadata of all documents linked to a specific pointer from the database.
+    Use open_document_stream or read_document_data to fetch the bytes.
     """
     db = get_database()
     documents_collection = db["documents"]
-    documents = list(documents_collection.find({"pointer_id": ObjectId(pointer_id)}))
+    documents = list(documents_collection.find({"pointer_id": ObjectId(pointer_id)}, METADATA_PROJECTION))
     return documents
 
+def iter_documents_by_pointer(pointer_id, projection=METADATA_PROJECTION, sort=None, batch_size=100):
+    """
+    Streams the metadata of the documents linked to a pointer.
+    """
+    db = get_database()
+    documents_collection = db["documents"]
+    return iter_documents(
+        documents_collection, {"pointer_id": ObjectId(pointer_id)},
+        projection=projection, sort=sort, batch_size=batch_size
+    )
+
+@traced
+def get_documents_page(pointer_id=None, projection=METADATA_PROJECTION, sort_field="upload_date", descending=True, after=None, limit=20):
+    """
+    Returns one keyset-paginated page of document metadata, optionally for one pointer, and the next page key.
+    """
+    db = get_database()
+    documents_collection = db["documents"]
+    query = {"pointer_id": ObjectId(pointer_id)} if pointer_id is not None else {}
+    return find_page(
+        documents_collection, query, projection=projection,
+        sort_field=sort_field, descending=descending, after=after, limit=limit
+    )
+
+@traced
+def get_document(document_id):
+    """
+    Retrieves the metadata of a single document.
+    """
+    db = get_database()
+    documents_collection = db["documents"]
+    return documents_collection.find_one({"_id": ObjectId(document_id)}, METADATA_PROJECTION)
+
+def _legacy_document_data(document):
+    """
+    Returns the inline bytes of a document stored before the blob store existed, or None.
+    """
+    if "blob_id" in document:
+        return None
+    db = get_database()
+    entry = db["documents"].find_one({"_id": document["_id"]}, {"document_data": 1})
+    return entry["document_data"] if entry else b""
+
+@traced
+def open_document_stream(document):
+    """
+    Opens a document's bytes as a readable stream.
+    """
+    legacy_data = _legacy_document_data(document)
+    if legacy_data is not None:
+        return io.BytesIO(legacy_data)
+    return get_blob_store().open(document["blob_id"])
+
+@traced
+def read_document_data(document):
+    """
+    Reads a document's bytes fully into memory. Prefer open_document_stream or document_file for large files.
+    """
+    with open_document_stream(document) as stream:
+        return stream.read()
+
+@contextmanager
+def document_file(document):
+    """
+    Yields the path of a local file holding the document's bytes without loading them into memory.
+    """
+    legacy_data = _legacy_document_data(document)
+    if legacy_data is None:
+        suffix = os.path.splitext(document["document_name"])[1]
+        with get_blob_store().local_path(document["blob_id"], suffix=suffix) as path:
+            yield path
+        return
+
+    handle, path = tempfile.mkstemp(suffix=os.path.splitext(document["document_name"])[1])
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(legacy_data)
+        yield path
+    finally:
+        os.remove(path)
+
+@traced
+def get_document_content_hash(document):
+    """
+    Returns the SHA-256 of a document's bytes, computing it by streaming for documents stored without one.
+    """
+    if document.get("content_hash"):
+        return document["content_hash"]
+    digest = hashlib.sha256()
+    with open_document_stream(document) as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@traced
 def update_document(document_id, updates):
     """
     Updates a specific document in the database.
@@ -37,17 +187,45 @@ def update_document(document_id, updates):
     )
     return result.modified_count
 
+@traced
+def set_preprocess_status(content_hash, status, error=None):
+    """
+    Records the upload-time preprocessing state (queued, running, done or failed) on every
+    document with the given content hash.
+    """
+    db = get_database()
+    documents_collection = db["documents"]
+    result = documents_collection.update_many(
+        {"content_hash": content_hash},
+        {"$set": {"preprocess_status": status, "preprocess_error": str(error) if error else None}}
+    )
+    return result.modified_count
+
+@traced
 def delete_document(document_id):
     """
-    Deletes a specific document from the database.
+    Deletes a specific document, and its stored bytes if no other document shares them.
     """
     db = get_database()
     documents_collection = db["documents"]
-    result = documents_collection.delete_one({"_id": ObjectId(document_id)})
-    return result.deleted_count
+    document = documents_collection.find_one_and_delete({"_id": ObjectId(document_id)}, {"blob_id": 1, "content_hash": 1})
+    if not document:
+        return 0
+    _free_blob(document)
+    return 1
 
+@traced
 def delete_documents_by_pointer(pointer_id):
+    """
+    Deletes all documents of a pointer, freeing the blobs no other document shares.
+    """
     db = get_database()
-    documents_collection = db["documents"]  
-    result = documents_collection.delete_many({"pointer_id": ObjectId(pointer_id)})
-    return result.deleted_count
+    documents_collection = db["documents"]
+    deleted = 0
+    # One at a time so each blob reference is released exactly once, even if two deletions race
+    for document in documents_collection.find({"pointer_id": ObjectId(pointer_id)}, {"_id": 1}):
+        entry = documents_collection.find_one_and_delete({"_id": document["_id"]}, {"blob_id": 1, "content_hash": 1})
+        if entry:
+            _free_blob(entry)
+            deleted += 1
+    return deleted
@@ -0,0 +1,100 @@
+import base64
+import io
+
+import fitz
+from PIL import Image
+
+# The vision models downscale anything larger than 2048px on the long edge before reading it,
+# so rendering beyond that only costs upload bandwidth.
+ENCODING_PROFILES = {
+    # Previous behaviour: 300 DPI colour PNG
+    "lossless": {"format": "png", "max_dpi": 300, "long_edge": None, "grayscale": False, "quality": None, "max_bytes": None},
+    "balanced": {"format": "jpeg", "max_dpi": 200, "long_edge": 2048, "grayscale": True, "quality": 80, "max_bytes": 1_500_000},
+    "compact": {"format": "webp", "max_dpi": 150, "long_edge": 1600, "grayscale": True, "quality": 70, "max_bytes": 600_000},
+}
+DEFAULT_PROFILE = "lossless"
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+MIN_QUALITY = 40
+MIN_LONG_EDGE = 768
+
+
+def get_profile(name=DEFAULT_PROFILE, **overrides):
+    """Return a copy of a named encoding profile with any non-None overrides applied."""
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown image encoding profile: {name}")
+    profile = dict(ENCODING_PROFILES[name])
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    return profile
+
+
+def select_dpi(page, profile):
+    """Pick the render DPI so the page's long edge lands on the profile's pixel target."""
+    if not profile["long_edge"]:
+        return profile["max_dpi"]
+    long_edge_inches = max(page.rect.width, page.rect.height) / 72
+    return max(36, min(profile["max_dpi"], int(profile["long_edge"] / long_edge_inches)))
+
+
+def _to_bytes(image, profile, quality):
+    """Serialize a PIL image in the profile's format."""
+    buffer = io.BytesIO()
+    if profile["format"] == "png":
+        image.save(buffer, format="PNG", optimize=False)
+    elif profile["format"] == "jpeg":
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    elif profile["format"] == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        raise ValueError(f"Unsupported image format: {profile['format']}")
+    return buffer.getvalue()
+
+
+def _fit(image, profile):
+    """Apply grayscale and long-edge limits, then shrink quality and size until under max_bytes."""
+    if profile["grayscale"] and image.mode != "L":
+        image = image.convert("L")
+    elif image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    if profile["long_edge"] and max(image.size) > profile["long_edge"]:
+        image.thumbnail((profile["long_edge"], profile["long_edge"]), Image.LANCZOS)
+
+    quality = profile["quality"] or 90
+    data = _to_bytes(image, profile, quality)
+    while profile["max_bytes"] and len(data) > profile["max_bytes"]:
+        if profile["format"] != "png" and quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 10)
+        elif max(image.size) > MIN_LONG_EDGE:
+            scale = max(MIN_LONG_EDGE / max(image.size), 0.8)
+            image = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+        else:
+            break
+        data = _to_bytes(image, profile, quality)
+    return data
+
+
+def encode_pdf_page(page, profile):
+    """Render a PDF page with the given profile and return (image bytes, mime type)."""
+    colorspace = fitz.csGRAY if profile["grayscale"] else fitz.csRGB
+    pix = page.get_pixmap(dpi=select_dpi(page, profile), colorspace=colorspace, alpha=False)
+    if profile["format"] == "png" and not profile["max_bytes"]:
+        # Fast path that avoids a round trip through Pillow
+        return pix.tobytes("png"), MIME_TYPES["png"]
+    mode = "L" if pix.n == 1 else "RGB"
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    return _fit(image, profile), MIME_TYPES[profile["format"]]
+
+
+def encode_image_file(image_bytes, profile):
+    """Re-encode an uploaded image with the given profile and return (image bytes, mime type)."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        if not (profile["grayscale"] or profile["long_edge"] or profile["max_bytes"]):
+            # Nothing to shrink: send the upload untouched
+            return image_bytes, Image.MIME[image.format]
+        image.load()
+        return _fit(image, profile), MIME_TYPES[profile["format"]]
+
+
+def to_data_url(image_bytes, mime_type):
+    """Encode image bytes as a Base64 data URL."""
+    return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
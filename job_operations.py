@@ -0,0 +1,201 @@
+from db_connection import get_database
+from tracing import traced
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Job lifecycle: queued -> running (stage ocr -> retrieval -> llm) -> done | failed
+JOB_STAGES = ("queued", "ocr", "retrieval", "llm", "done")
+# Upload-time preprocessing jobs (type "preprocess") go through these stages instead
+PREPROCESS_STAGES = ("queued", "ocr", "embedding", "done")
+# Claims of a job whose worker stopped responding before it is failed instead of requeued
+DEFAULT_MAX_ATTEMPTS = 3
+
+@traced
+def submit_compliance_job(pointer_id, bypass_cache=False):
+    """
+    Queues a compliance check for a pointer, unless one is already queued or running.
+    Active jobs hold active_key = pointer id under a unique index, so concurrent submissions
+    for the same pointer coalesce into a single job. bypass_cache asks the worker not to reuse a
+    cached LLM verdict. Returns (job id, True if newly queued).
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    try:
+        result = jobs_collection.insert_one({
+            "pointer_id": ObjectId(pointer_id),
+            "active_key": str(pointer_id),
+            "status": "queued",
+            "stage": "queued",
+            "attempts": 0,
+            "bypass_cache": bypass_cache,
+            "created_at": now,
+            "updated_at": now
+        })
+        return str(result.inserted_id), True
+    except DuplicateKeyError:
+        job = jobs_collection.find_one({"active_key": str(pointer_id)}, {"_id": 1})
+        if job is None:
+            # The active job finished in between; queue a new one
+            return submit_compliance_job(pointer_id, bypass_cache)
+        return str(job["_id"]), False
+
+@traced
+def submit_preprocess_job(document_id, content_hash):
+    """
+    Queues text extraction and query embedding for an uploaded document. Uploads of the same
+    file share one job through active_key = "preprocess:<content hash>", since the results are
+    stored per content hash. Returns (job id, True if newly queued).
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    active_key = f"preprocess:{content_hash}"
+    try:
+        result = jobs_collection.insert_one({
+            "type": "preprocess",
+            "document_id": ObjectId(document_id),
+            "content_hash": content_hash,
+            "active_key": active_key,
+            "status": "queued",
+            "stage": "queued",
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        })
+        return str(result.inserted_id), True
+    except DuplicateKeyError:
+        job = jobs_collection.find_one({"active_key": active_key}, {"_id": 1})
+        if job is None:
+            return submit_preprocess_job(document_id, content_hash)
+        return str(job["_id"]), False
+
+@traced
+def claim_next_job(worker_id):
+    """
+    Atomically marks the oldest queued job as running for this worker and returns it, or None.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    return jobs_collection.find_one_and_update(
+        {"status": "queued"},
+        {
+            "$set": {"status": "running", "stage": "ocr", "worker": worker_id, "started_at": now, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+@traced
+def update_job_progress(job_id, worker_id, stage, **fields):
+    """
+    Records the stage a running job has reached; updated_at doubles as the worker's heartbeat.
+    Returns False if the job is no longer running for this worker (it was requeued and claimed
+    by another one), in which case nothing is written.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    result = jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "worker": worker_id},
+        {"$set": {"stage": stage, "updated_at": datetime.now(), **fields}}
+    )
+    return result.matched_count > 0
+
+@traced
+def heartbeat_job(job_id, worker_id):
+    """
+    Marks a running job as still alive without changing its stage. Returns False if the job is
+    no longer running for this worker.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    result = jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "worker": worker_id},
+        {"$set": {"updated_at": datetime.now()}}
+    )
+    return result.matched_count > 0
+
+@traced
+def complete_job(job_id, worker_id, result_id=None, compliance_status=None):
+    """
+    Marks a job done, with its compliance result for check jobs, and releases the pointer
+    (or document) for new submissions. Returns False, leaving the job alone, if it is no longer
+    running for this worker.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    updates = {"status": "done", "stage": "done", "finished_at": now, "updated_at": now}
+    if result_id is not None:
+        updates.update(result_id=ObjectId(result_id), compliance_status=compliance_status)
+    result = jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "worker": worker_id},
+        {"$set": updates, "$unset": {"active_key": ""}}
+    )
+    return result.matched_count > 0
+
+@traced
+def fail_job(job_id, error, worker_id=None):
+    """
+    Marks a job failed with the error message and releases the pointer for new submissions.
+    With worker_id, only a job still running for that worker is failed.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    query = {"_id": ObjectId(job_id)}
+    if worker_id is not None:
+        query.update(status="running", worker=worker_id)
+    jobs_collection.update_one(
+        query,
+        {
+            "$set": {"status": "failed", "error": str(error), "finished_at": now, "updated_at": now},
+            "$unset": {"active_key": ""}
+        }
+    )
+
+@traced
+def requeue_stale_jobs(timeout_seconds, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Puts running jobs without a heartbeat for timeout_seconds (e.g. their worker died) back in
+    the queue, or fails them once they have been claimed max_attempts times, so a job that keeps
+    crashing its worker is not retried forever. Returns (requeued, failed) job counts.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    now = datetime.now()
+    stale = {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=timeout_seconds)}}
+    failed = jobs_collection.update_many(
+        {**stale, "attempts": {"$gte": max_attempts}},
+        {
+            "$set": {
+                "status": "failed", "error": f"worker stopped responding on all {max_attempts} attempts",
+                "finished_at": now, "updated_at": now
+            },
+            "$unset": {"active_key": "", "worker": ""}
+        }
+    )
+    requeued = jobs_collection.update_many(
+        {**stale, "attempts": {"$lt": max_attempts}},
+        {"$set": {"status": "queued", "stage": "queued", "updated_at": now}, "$unset": {"worker": ""}}
+    )
+    return requeued.modified_count, failed.modified_count
+
+@traced
+def get_job(job_id):
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    return jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+@traced
+def get_latest_job(pointer_id):
+    """
+    Retrieves the most recently submitted job of a pointer, or None.
+    """
+    db = get_database()
+    jobs_collection = db["compliance_jobs"]
+    return jobs_collection.find_one({"pointer_id": ObjectId(pointer_id)}, sort=[("created_at", -1)])
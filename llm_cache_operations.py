@@ -0,0 +1,59 @@
+from db_connection import get_database, record_cache_write
+from tracing import traced
+from datetime import datetime, timedelta
+import hashlib
+
+DEFAULT_TTL_DAYS = 30
+
+def verdict_cache_key(prompt_text, model, temperature):
+    """
+    Hash of everything that determines the model's answer: the fully rendered prompt, the model and the temperature.
+    """
+    digest = hashlib.sha256()
+    for part in (model, repr(temperature), prompt_text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+@traced
+def get_cached_verdict(key):
+    """
+    Retrieves the cached LLM response for a key, or None. Expired entries are never returned,
+    even before MongoDB's TTL monitor has removed them.
+    """
+    db = get_database()
+    cache_collection = db["llm_cache"]
+    now = datetime.now()
+    entry = cache_collection.find_one_and_update(
+        {"_id": key, "expires_at": {"$gt": now}},
+        {"$set": {"last_used": now}, "$inc": {"hits": 1}},
+        projection={"response": 1}
+    )
+    return entry["response"] if entry else None
+
+@traced
+def cache_verdict(key, model, temperature, response, ttl_days, max_cache_bytes):
+    """
+    Stores an LLM response for ttl_days and evicts the least recently used entries once the
+    cache grows beyond max_cache_bytes.
+    """
+    db = get_database()
+    cache_collection = db["llm_cache"]
+    now = datetime.now()
+    size = len(response.encode("utf-8"))
+    replaced = cache_collection.find_one_and_replace(
+        {"_id": key},
+        {
+            "model": model,
+            "temperature": temperature,
+            "response": response,
+            "size": size,
+            "hits": 0,
+            "created_at": now,
+            "last_used": now,
+            "expires_at": now + timedelta(days=ttl_days)
+        },
+        projection={"size": 1},
+        upsert=True
+    )
+    return record_cache_write(db, "llm_cache", size - (replaced["size"] if replaced else 0), max_cache_bytes)
@@ -0,0 +1,57 @@
+from db_connection import get_database, record_cache_write
+from tracing import traced
+from datetime import datetime
+
+def _cache_key(content_hash, page, model, prompt_version):
+    return f"{content_hash}:{page}:{model}:{prompt_version}"
+
+@traced
+def get_cached_pages(content_hash, page_numbers, model, prompt_version):
+    """
+    Retrieves cached OCR text for the given pages of a document.
+    Returns a dict mapping page number to text for the pages found in the cache.
+    """
+    db = get_database()
+    cache_collection = db["ocr_cache"]
+    keys = [_cache_key(content_hash, page, model, prompt_version) for page in page_numbers]
+    if not keys:
+        return {}
+    entries = list(cache_collection.find({"_id": {"$in": keys}}, {"page": 1, "text": 1}))
+    if entries:
+        cache_collection.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in entries]}},
+            {"$set": {"last_used": datetime.now()}}
+        )
+    return {entry["page"]: entry["text"] for entry in entries}
+
+@traced
+def cache_pages(content_hash, page_texts, model, prompt_version, max_cache_bytes):
+    """
+    Stores OCR text for the given pages ({page number: text}) and evicts the least recently
+    used entries once the cache grows beyond max_cache_bytes.
+    """
+    if not page_texts:
+        return 0
+    db = get_database()
+    cache_collection = db["ocr_cache"]
+    now = datetime.now()
+    size_delta = 0
+    for page, text in page_texts.items():
+        size = len(text.encode("utf-8"))
+        replaced = cache_collection.find_one_and_replace(
+            {"_id": _cache_key(content_hash, page, model, prompt_version)},
+            {
+                "content_hash": content_hash,
+                "page": page,
+                "model": model,
+                "prompt_version": prompt_version,
+                "text": text,
+                "size": size,
+                "created_at": now,
+                "last_used": now
+            },
+            projection={"size": 1},
+            upsert=True
+        )
+        size_delta += size - (replaced["size"] if replaced else 0)
+    return record_cache_write(db, "ocr_cache", size_delta, max_cache_bytes)
@@ -0,0 +1,189 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from tracing import span, run_in_context
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_PROMPT = "Extract the text from this page (Page {page}):"
+# Bump whenever DEFAULT_PROMPT changes so cached OCR text produced by the old prompt is not reused
+PROMPT_VERSION = "1"
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared by all OCR worker threads.
+    Enforces a requests-per-minute and a tokens-per-minute budget; either may be None (unlimited).
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                float(self.requests_per_minute),
+                self._request_allowance + elapsed * self.requests_per_minute / 60.0,
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                float(self.tokens_per_minute),
+                self._token_allowance + elapsed * self.tokens_per_minute / 60.0,
+            )
+
+    def acquire(self, tokens=0):
+        """Block until one request and `tokens` tokens fit in the budget, then reserve them."""
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self._request_allowance < 1:
+                    wait = max(wait, (1 - self._request_allowance) * 60.0 / self.requests_per_minute)
+                if self.tokens_per_minute and self._token_allowance < tokens:
+                    wait = max(wait, (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute)
+                if wait <= 0:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+            time.sleep(wait)
+
+    def settle(self, reserved_tokens, actual_tokens):
+        """Correct the token budget once the real usage of a request is known."""
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        with self._lock:
+            self._token_allowance = min(
+                float(self.tokens_per_minute),
+                self._token_allowance + reserved_tokens - actual_tokens,
+            )
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error):
+    """Return the server-suggested delay in seconds, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(request, max_retries=5, base_delay=1.0, max_delay=30.0):
+    """
+    Run `request()` retrying on 429/5xx and connection errors with exponential backoff and jitter.
+    Non-retryable errors and the last retryable error are re-raised.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return request()
+        except Exception as e:
+            if attempt > max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            time.sleep(delay)
+
+
+def _extract_page(client, page_number, image_url, model, prompt, max_tokens, limiter, max_retries, estimated_tokens):
+    """OCR a single page, returning a result dict instead of raising."""
+    result = {"page": page_number, "text": None, "error": None, "attempts": 0, "tokens": 0}
+
+    def request():
+        result["attempts"] += 1
+        limiter.acquire(estimated_tokens)
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt.format(page=page_number)},
+                        {"type": "image_url", "image_url": {"url": image_url}},
+                    ],
+                }
+            ],
+            max_tokens=max_tokens,
+        )
+        usage = getattr(response, "usage", None)
+        limiter.settle(estimated_tokens, usage.total_tokens if usage else None)
+        return response
+
+    with span("ocr.page") as attributes:
+        try:
+            response = call_with_retry(request, max_retries=max_retries)
+            result["text"] = (response.choices[0].message.content or "").strip()
+            if getattr(response, "usage", None):
+                result["tokens"] = response.usage.total_tokens
+        except Exception as e:
+            result["error"] = str(e)
+        attributes.update(tokens=result["tokens"], attempts=result["attempts"])
+    return result
+
+
+def extract_pages(
+    client,
+    pages,
+    model=DEFAULT_MODEL,
+    prompt=DEFAULT_PROMPT,
+    max_tokens=1000,
+    max_workers=4,
+    requests_per_minute=None,
+    tokens_per_minute=None,
+    max_retries=5,
+    estimated_tokens_per_page=2000,
+    limiter=None,
+):
+    """
+    Extract text from page images concurrently using OpenAI Vision.
+
+    `pages` is an iterable of (page_number, image_url) pairs; it is consumed lazily so that at most
+    a couple of pages per worker are held in memory at once. Returns one result dict per page,
+    ordered by page number, with either `text` or `error` set.
+    Pass a shared `limiter` to enforce one rate budget across concurrent calls; otherwise one is
+    created from requests_per_minute and tokens_per_minute.
+    """
+    limiter = limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+    # The engine owns retries, so disable the SDK's own retry loop to keep backoff predictable.
+    client = client.with_options(max_retries=0)
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr") as executor:
+        for page_number, image_url in pages:
+            in_flight.acquire()
+            # Page spans are recorded on the caller's trace
+            future = executor.submit(
+                run_in_context(_extract_page), client, page_number, image_url, model, prompt,
+                max_tokens, limiter, max_retries, estimated_tokens_per_page,
+            )
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+    results = [future.result() for future in futures]
+    return sorted(results, key=lambda r: r["page"])
@@ -1,4 +1,5 @@
 import streamlit as st
+from vector_store_registry import get_vector_store_registry
 
 st.set_page_config(page_title="Year Selection", page_icon="📅")
 
@@ -8,7 +9,9 @@ st.write("Select a year to continue with the compliance setup.")
 if "selected_year" not in st.session_state:
     st.session_state.selected_year = 2024
 
-year = st.selectbox("Choose the compliance year:", [2024])
+# Years with a regulation index on disk
+years = sorted({int(year) for year, _ in get_vector_store_registry().available()}) or [2024]
+year = st.selectbox("Choose the compliance year:", years)
 
 if st.button("Proceed"):
     st.session_state.selected_year = year  
@@ -1,6 +1,7 @@
 import streamlit as st
 from pointer_operations import add_pointer, update_pointer
-from document_operations import add_document, get_documents_by_pointer, delete_document
+from document_operations import add_document, get_document, get_documents_by_pointer, delete_document, read_document_data, update_document
+from job_operations import submit_preprocess_job
 from bson.objectid import ObjectId
 import regex as re
 
@@ -24,6 +25,15 @@ else:
     }
     edit_mode = False
 
+# Queue text extraction and embedding of uploads for the background worker (scripts/compliance_worker.py)
+PREPROCESS_ON_UPLOAD = bool(st.secrets.get("preprocessing", {}).get("enabled", False))
+PREPROCESS_STATUS_LABELS = {
+    "queued": "⏳ waiting to be processed",
+    "running": "⚙️ processing",
+    "done": "✅ processed",
+    "failed": "⚠️ processing failed",
+}
+
 def remove_existing_numbers(text):
     lines = text.strip().split("\n")
     cleaned_text = "\n".join([re.sub(r"^\d+\.\s*", "", line.strip()) for line in lines if line.strip()])
@@ -52,9 +62,11 @@ if edit_mode:
             col1, col2 = st.columns([8, 1])
             with col1:
                 if doc_name.lower().endswith(('.png', '.jpeg', '.jpg')):
-                    st.image(doc["document_data"], caption=doc_name, use_column_width=True)
+                    st.image(read_document_data(doc), caption=doc_name, use_column_width=True)
                 else:
                     st.write(f"[{doc_name}](#)")  # Adjust for download link if needed
+                if doc.get("preprocess_status"):
+                    st.caption(PREPROCESS_STATUS_LABELS.get(doc["preprocess_status"], doc["preprocess_status"]))
             with col2:
                 delete_button = st.button("🗑️", key=f"delete_{doc['_id']}")
                 if delete_button:
@@ -89,8 +101,11 @@ if st.button("Save Pointer"):
 
         if uploaded_files:
             for uploaded_file in uploaded_files:
-                add_document(pointer_data["_id"], uploaded_file.name, uploaded_file.getvalue())
+                document_id = add_document(pointer_data["_id"], uploaded_file.name, uploaded_file)
                 st.write(f"Uploaded document: {uploaded_file.name}")
+                if PREPROCESS_ON_UPLOAD:
+                    update_document(document_id, {"preprocess_status": "queued"})
+                    submit_preprocess_job(document_id, get_document(document_id)["content_hash"])
 
         st.session_state.compliance_pointer = pointer_data
 
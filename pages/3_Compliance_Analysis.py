@@ -1,20 +1,15 @@
 import os
-import base64
 import streamlit as st
 from openai import OpenAI
 from dotenv import load_dotenv
-from compliance_operations import add_compliance_result
-from document_operations import get_documents_by_pointer
+from contextlib import nullcontext
+from compliance_operations import add_compliance_result, get_compliance_result
 from pointer_operations import update_pointer
-from langchain_openai import OpenAIEmbeddings
+from job_operations import JOB_STAGES, submit_compliance_job, get_job, get_latest_job
+from vector_store_registry import get_vector_store_registry
+from compliance_pipeline import LLM_MODEL, load_settings, stream_check_pointer
 from langchain_openai.chat_models import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.vectorstores import FAISS
-from typing import List
-import fitz
 import time
-from pathlib import Path
 
 dotenv_path = "pages/.env"
 load_dotenv(dotenv_path=dotenv_path, override=True)
@@ -35,135 +30,73 @@ if not api_key:
 # Initialize OpenAI Client
 client = OpenAI(api_key=api_key)
 
-# Initialize Embeddings and LLM
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large", openai_api_key=api_key)
-llm = ChatOpenAI(model="gpt-4o", openai_api_key=api_key)
-
-# FAISS Index Paths
-FAISS_INDEX_PATHS = {
-    "Arabic": Path("pages") / "faiss_indexes" / "2024" / "Arabic",
-    "English": Path("pages") / "faiss_indexes" / "2024" / "English"
+# Initialize LLM
+llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=api_key)
+
+# OCR, retrieval, prompt budget and verdict cache settings from [ocr], [retrieval], [prompt] and [llm_cache] in secrets.toml
+PIPELINE_SETTINGS = load_settings(st.secrets)
+
+# Run checks in the background worker (scripts/compliance_worker.py) instead of in this script thread
+JOBS_ENABLED = bool(st.secrets.get("jobs", {}).get("enabled", False))
+JOB_POLL_SECONDS = float(st.secrets.get("jobs", {}).get("poll_seconds", 2))
+JOB_STAGE_LABELS = {
+    "queued": "Waiting for a worker...",
+    "ocr": "Extracting text from the documents...",
+    "retrieval": "Retrieving regulation context...",
+    "llm": "Evaluating compliance...",
+    "done": "Done",
 }
 
-# Utility Functions
-def encode_image(image_path):
-    """Encode an image to Base64."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-
-def convert_pdf_to_images(pdf_path, output_folder="temp_images"):
-    """Convert a PDF into individual images (one per page)."""
-    doc = fitz.open(pdf_path)
-    image_paths = []
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(dpi=300)  # Adjust DPI for better resolution
-        image_path = os.path.join(output_folder, f"page_{page_num + 1}.png")
-        pix.save(image_path)
-        image_paths.append(image_path)
-    return image_paths
-
-
-def extract_text_with_openai_vision(image_paths, client):
-    """Extract text from images using OpenAI Vision."""
-    extracted_texts = []
-    for idx, image_path in enumerate(image_paths, start=1):
-        try:
-            base64_image = encode_image(image_path)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"Extract the text from this page (Page {idx}):",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/png;base64,{base64_image}"},
-                            },
-                        ],
-                    }
-                ],
-                max_tokens=1000,  # Adjust to handle longer text
-            )
-            extracted_texts.append(response.choices[0].message.content.strip())
-        except Exception as e:
-            st.error(f"Error processing page {idx}: {e}")
-    return "\n".join(extracted_texts)
-
-
-def process_documents_with_vision(documents, client):
-    """Process uploaded documents using OpenAI Vision."""
-    temp_dir = "temp_files"
-    os.makedirs(temp_dir, exist_ok=True)
-
-    combined_text = ""
-    for doc in documents:
-        try:
-            # Handle PDFs
-            if doc["document_name"].lower().endswith(".pdf"):
-                pdf_path = os.path.join(temp_dir, doc["document_name"])
-                with open(pdf_path, "wb") as f:
-                    f.write(doc["document_data"])
-
-                # Convert PDF to images
-                image_paths = convert_pdf_to_images(pdf_path, output_folder=temp_dir)
-                text = extract_text_with_openai_vision(image_paths, client)
-
-            # Handle images
-            elif doc["document_name"].lower().endswith((".png", ".jpg", ".jpeg")):
-                image_path = os.path.join(temp_dir, doc["document_name"])
-                with open(image_path, "wb") as f:
-                    f.write(doc["document_data"])
-
-                # Extract text directly from the image
-                text = extract_text_with_openai_vision([image_path], client)
-
-            else:
-                raise ValueError(f"Unsupported file format: {doc['document_name']}")
-
-            combined_text += f"\n{text}"
-        except Exception as e:
-            st.error(f"Error processing document {doc['document_name']}: {e}")
+# Vector stores per year and language, opened on first use (see [vector_store] in secrets.toml)
+vector_store_registry = get_vector_store_registry()
+with st.sidebar.expander("Vector store cache"):
+    registry_stats = vector_store_registry.stats()
+    st.write(
+        f"{registry_stats['hits']} hits, {registry_stats['misses']} loads, {registry_stats['evictions']} evictions; "
+        f"{registry_stats['resident_bytes'] / (1024 * 1024):.1f} MB open"
+    )
+    for entry in registry_stats["open"]:
+        st.write(f"{entry['year']} {entry['language']}: {entry['bytes'] / (1024 * 1024):.1f} MB")
 
-    return combined_text
-
-
-@st.cache_resource
-def load_vector_store(path: str):
-    """Load FAISS vector store."""
-    try:
-        return FAISS.load_local(
-            folder_path=path,
-            embeddings=embeddings,
-            allow_dangerous_deserialization=True
+# Utility Functions
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    """Poll a queued or running job and rerun the page once it has finished."""
+    job = get_job(job_id)
+    if job is None or job["status"] in ("done", "failed"):
+        st.rerun()
+    st.progress(JOB_STAGES.index(job["stage"]) / (len(JOB_STAGES) - 1), text=JOB_STAGE_LABELS[job["stage"]])
+    if job.get("partial_output"):
+        st.markdown(job["partial_output"])
+
+
+def show_job_result(job, pointer):
+    """Show the outcome of a finished background job."""
+    if job["status"] == "failed":
+        st.error(f"Compliance check failed: {job.get('error')}")
+        return
+    result = get_compliance_result(job["result_id"])
+    pointer["compliance_status"] = result["compliance_status"]
+    elapsed_time = (job["finished_at"] - job["created_at"]).total_seconds()
+    st.success(f"Compliance Status: {result['compliance_status']}")
+    st.write(f"Reasons: {result['details']}")
+    llm_timing = result.get("llm_timing") or {}
+    if llm_timing.get("ttft_seconds") is not None:
+        st.info(
+            f"Compliance check completed in {elapsed_time:.2f} seconds "
+            f"(first token after {llm_timing['ttft_seconds']:.2f}s, "
+            f"generation {llm_timing['generation_seconds']:.2f}s)."
+        )
+    else:
+        st.info(f"Compliance check completed in {elapsed_time:.2f} seconds.")
+    if result.get("reused_stages"):
+        st.caption(f"Unchanged since the previous check, reused: {', '.join(result['reused_stages'])}.")
+    ocr_reuse = result.get("ocr_reuse")
+    if ocr_reuse and 0 < ocr_reuse["reused"] < ocr_reuse["documents"]:
+        st.caption(
+            f"Text reused for {ocr_reuse['reused']} of {ocr_reuse['documents']} document(s); "
+            f"extracted again: {', '.join(ocr_reuse['extracted'])}."
         )
-    except Exception as e:
-        st.error(f"Failed to load vector store at {path}: {e}")
-        return None
-
-
-def retrieve_with_scores(query: str, retriever) -> List[dict]:
-    """Retrieve documents and their similarity scores from the vector store."""
-    results = retriever.vectorstore.similarity_search_with_score(query)
-    if not results:
-        st.warning("No relevant chunks retrieved. Ensure the document is correctly embedded.")
-        return []
-    return [{"content": doc.page_content, "score": score} for doc, score in results]
-
-
-def filter_relevant_chunks(chunks: List[dict]) -> List[dict]:
-    """Filter out irrelevant chunks based on content quality."""
-    relevant_chunks = []
-    for chunk in chunks:
-        content = chunk.get("content", "").strip()
-        if len(content.split()) >= 5 and sum(c.isalpha() for c in content) / len(content) > 0.5:
-            relevant_chunks.append(chunk)
-    return relevant_chunks
 
 
 # Compliance Analysis Logic
@@ -182,97 +115,97 @@ if "compliance_pointer" in st.session_state:
         """, unsafe_allow_html=True)
 
     st.subheader("🔍 Compliance Check")
-    if st.button("Check Compliance"):
+    bypass_llm_cache = st.checkbox(
+        "Re-evaluate even if these inputs were checked before",
+        help="Skips the cached verdict for an identical prompt and asks the model again."
+    )
+    check_clicked = st.button("Check Compliance")
+    if check_clicked and JOBS_ENABLED:
+        job_id, queued = submit_compliance_job(pointer["_id"], bypass_llm_cache)
+        if not queued:
+            st.info("A compliance check for this pointer is already in progress.")
+        st.session_state.compliance_job_id = job_id
+
+    elif check_clicked:
         start_time = time.time()  # Start the timer
-        st.info("Compliance check started... Please wait.")
-
-        documents = get_documents_by_pointer(pointer["_id"])
-        if documents:
-            # Extract text from documents using Vision
-            text_data = process_documents_with_vision(documents, client)
-
-            # Load vector store
-            vector_store_path = FAISS_INDEX_PATHS.get(pointer["language"])
-            if not vector_store_path or not os.path.exists(vector_store_path):
-                st.error(f"Vector store directory for {pointer['language']} not found.")
-                st.stop()
-
-            vector_store = load_vector_store(vector_store_path)
-            if not vector_store:
-                st.stop()
-
-            retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-            retrieved_chunks = retrieve_with_scores(text_data, retriever)
-            filtered_chunks = filter_relevant_chunks(retrieved_chunks)
-
-            formatted_chunks = "\n".join(
-                [f"Score: {chunk['score']}\nContent: {chunk['content']}" for chunk in filtered_chunks]
+        progress_placeholder = st.empty()
+        status_placeholder = st.empty()
+        outcome = {}
+
+        def show_stage(name):
+            """Show which step the check is in; the pipeline enters it around each stage."""
+            progress_placeholder.info(JOB_STAGE_LABELS[name])
+            return nullcontext()
+
+        def show_status_early(stream):
+            """Pass the stream through, showing the status as soon as its line has arrived."""
+            shown = False
+            for piece in stream:
+                if not shown and "status" in outcome:
+                    status_placeholder.success(f"Compliance Status: {outcome['status']}")
+                    shown = True
+                yield piece
+
+        # The same pipeline as the background worker, with the verdict rendered as it streams.
+        # The pointer's year falls back to the year picked on the year selection page.
+        checked_pointer = {**pointer, "year": pointer.get("year", st.session_state.get("selected_year", 2024))}
+        try:
+            st.write_stream(show_status_early(stream_check_pointer(
+                checked_pointer, client, llm, vector_store_registry, PIPELINE_SETTINGS, outcome,
+                stage=show_stage, bypass_cache=bypass_llm_cache
+            )))
+        except Exception as e:
+            progress_placeholder.empty()
+            st.error(f"Compliance check failed: {e}")
+        else:
+            progress_placeholder.empty()
+            result = outcome["result"]
+            metadata = result["metadata"]
+            for error in metadata["ocr_errors"]:
+                st.error(error)
+            if not metadata["retrieved_chunks"]:
+                st.warning("No relevant chunks retrieved. Ensure the document is correctly embedded.")
+
+            compliance_status = result["compliance_status"]
+            add_compliance_result(result["pointer_id"], compliance_status, result["details"], metadata=metadata)
+            pointer["compliance_status"] = compliance_status
+            update_pointer(pointer["_id"], pointer)
+
+            end_time = time.time()  # End the timer
+            elapsed_time = end_time - start_time  # Calculate elapsed time
+
+            status_placeholder.success(f"Compliance Status: {compliance_status}")
+            llm_timing = metadata["llm_timing"]
+            if llm_timing["ttft_seconds"] is not None:
+                st.info(
+                    f"Compliance check completed in {elapsed_time:.2f} seconds "
+                    f"(first token after {llm_timing['ttft_seconds']:.2f}s, "
+                    f"generation {llm_timing['generation_seconds']:.2f}s)."
+                )
+            else:
+                st.info(f"Compliance check completed in {elapsed_time:.2f} seconds.")
+            ocr_cache_stats = metadata["ocr_cache"]
+            st.caption(
+                (f"{ocr_cache_stats['preprocessed']} document(s) already extracted. " if ocr_cache_stats["preprocessed"] else "")
+                + (f"Extracted again: {', '.join(ocr_cache_stats['extracted'])}. "
+                   if ocr_cache_stats["preprocessed"] and ocr_cache_stats["extracted"] else "")
+                + f"Pages: {ocr_cache_stats['native']} read from the PDF text layer, "
+                f"{ocr_cache_stats['hits']} reused from the OCR cache, "
+                f"{ocr_cache_stats['misses']} sent to the vision model."
+                + (" Regulation context reused from the previous check." if "retrieval" in metadata["reused_stages"] else "")
+                + (" Verdict reused from an identical earlier check." if metadata["llm_cache"]["hit"] else "")
             )
-
-            # LLM Evaluation
-            system_prompt_template = ChatPromptTemplate.from_template(
-                """
-                You are an AI Assistant tasked with evaluating compliance based on the provided information.
-
-                **Input Details:**
-                - **Compliance Requirements**: {compliance_requirements}
-                - **Supporting Document Points**: {supporting_document_points}
-                - **Retrieved Document Context**: {formatted_chunks}
-
-                **Your Task:**
-                1. **Supporting Document Points Verification**:
-                   - Analyze the "Supporting Document Points" provided.
-                   - Verify their alignment with the retrieved document context.
-                   - Identify any gaps or missing information for each supporting point.
-
-                2. **Compliance Requirements Verification**:
-                   - Evaluate the provided "Compliance Requirements."
-                   - Use the retrieved document context and supporting document points for this evaluation.
-                   - Determine whether the compliance requirements are fully met, partially met, or not met.
-                   - Highlight which requirements or sub-requirements are not satisfied, if applicable.
-
-                3. **Provide a Compliance Status**:
-                   - Based on your evaluation, assign one of the following compliance statuses:
-                     - **Fully Compliant**: All supporting document points and compliance requirements are fully addressed.
-                     - **Partially Compliant**: Some points or requirements are addressed, but others are incomplete or missing.
-                     - **Not Compliant**: The provided documents fail to meet the supporting document points and compliance requirements.
-
-                **Output Format**:
-                - **Compliance Status**: [Fully Compliant / Partially Compliant / Not Compliant]
-                - **Reasons for Compliance Status**:
-                  - Provide detailed explanations for each compliance requirement and supporting document point.
-                  - For each point or requirement not met, include a reason why it was not satisfied.
-                  - Sub-requirement Analysis (if applicable):
-                    - Sub-requirement A: [Met/Not Met] - Explanation
-                    - Sub-requirement B: [Met/Not Met] - Explanation
-                    - Sub-requirement C: [Met/Not Met] - Explanation
-                """
+            prompt_tokens = metadata["prompt_tokens"]
+            st.caption(
+                f"Prompt: {prompt_tokens['total']} of {prompt_tokens['budget']} tokens "
+                f"({prompt_tokens['chunks_included']} regulation chunks, {prompt_tokens['evidence']} evidence tokens"
+                + (", evidence truncated" if prompt_tokens["evidence_truncated"] else "") + ")."
             )
-            chain = system_prompt_template | llm | StrOutputParser()
-
-            try:
-                llm_response = chain.invoke({
-                    "compliance_requirements": pointer['compliance_requirements'],
-                    "supporting_document_points": pointer.get('supporting_document_points', 'No supporting points provided.'),
-                    "formatted_chunks": formatted_chunks
-                }).strip()
-
-                compliance_status = llm_response.split("\n")[0].split(":")[-1].strip()
-                reasons_for_status = "\n".join(llm_response.split("\n")[1:]).strip()
 
-                add_compliance_result(pointer["_id"], compliance_status, reasons_for_status)
-                pointer["compliance_status"] = compliance_status
-                update_pointer(pointer["_id"], pointer)
-
-                end_time = time.time()  # End the timer
-                elapsed_time = end_time - start_time  # Calculate elapsed time
-
-                st.success(f"Compliance Status: {compliance_status}")
-                st.write(f"Reasons: {reasons_for_status}")
-                st.info(f"Compliance check completed in {elapsed_time:.2f} seconds.")
-
-            except Exception as e:
-                st.error(f"Error processing LLM response: {e}")
-
-        else:
-            st.warning("No documents found for this compliance pointer.")
+    if JOBS_ENABLED:
+        # The latest job is looked up again on every rerun, so progress survives a browser refresh
+        latest_job = get_latest_job(pointer["_id"])
+        if latest_job and latest_job["status"] in ("queued", "running"):
+            show_job_progress(str(latest_job["_id"]))
+        elif latest_job and st.session_state.get("compliance_job_id") == str(latest_job["_id"]):
+            show_job_result(latest_job, pointer)
@@ -1,7 +1,6 @@
 import streamlit as st
-from pointer_operations import get_all_pointers, delete_pointer
-from document_operations import delete_documents_by_pointer, get_documents_by_pointer
-import base64
+from pointer_operations import count_pointers, get_pointers_with_document_summaries, delete_pointer
+from document_operations import delete_documents_by_pointer, get_document, read_document_data
 
 
 st.set_page_config(page_title="View Pointers", page_icon="📄")
@@ -66,10 +65,50 @@ def format_with_lines(text):
     return formatted_text
 
 
-pointer_list = get_all_pointers()
+def format_size(size):
+    if size is None:
+        return ""
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def render_document_list(pointer_id, documents):
+    """List document names and sizes; bytes are only fetched for the document the user asks to download."""
+    for doc in documents:
+        doc_id = str(doc["_id"])
+        col1, col2 = st.columns([6, 2])
+        with col1:
+            st.write(f"{doc['document_name']} ({format_size(doc.get('size'))})")
+            if doc.get("preprocess_status"):
+                st.caption(f"Preprocessing: {doc['preprocess_status']}")
+        with col2:
+            if st.session_state.get("download_document_id") == doc_id:
+                st.download_button(
+                    "Save file",
+                    data=read_document_data(get_document(doc_id)),
+                    file_name=doc["document_name"],
+                    key=f"save_{doc_id}"
+                )
+            elif st.button("Download", key=f"download_{pointer_id}_{doc_id}"):
+                st.session_state.download_document_id = doc_id
+                st.rerun()
+
+
+total_pointers = count_pointers()
+page_size = st.sidebar.selectbox("Pointers per page", [10, 20, 50], index=1)
+page_count = max(1, (total_pointers + page_size - 1) // page_size)
+page_number = st.sidebar.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+st.sidebar.write(f"{total_pointers} pointer(s), page {page_number} of {page_count}")
+
+pointer_list = get_pointers_with_document_summaries(skip=(page_number - 1) * page_size, limit=page_size)
 
 if pointer_list:
-    for idx, pointer in enumerate(pointer_list):
+    for offset, pointer in enumerate(pointer_list):
+        idx = (page_number - 1) * page_size + offset
+        uploaded_documents = pointer.pop("documents", [])
         st.subheader(f"Pointer Name: {pointer['name']}")
         st.write(f"**Year:** {pointer.get('year', '2024')}")
 
@@ -99,13 +138,8 @@ if pointer_list:
             st.write("No supporting points defined.")
 
         st.markdown("**Uploaded Documents:**")
-        uploaded_documents = get_documents_by_pointer(pointer["_id"])
         if uploaded_documents:
-            document_list_items = "".join([
-                f"<div><a href='data:application/octet-stream;base64,{base64.b64encode(doc['document_data']).decode()}' download='{doc['document_name']}' style='color: #1E90FF;'>{doc['document_name']}</a></div>"
-                for doc in uploaded_documents
-            ])
-            st.markdown(f"<div class='content-box'>{document_list_items}</div>", unsafe_allow_html=True)
+            render_document_list(pointer["_id"], uploaded_documents)
         else:
             st.write("No documents uploaded.")
 
@@ -1,17 +1,99 @@
-from db_connection import get_database
+from db_connection import get_database, iter_documents, find_page
+from tracing import traced
 from bson.objectid import ObjectId
 
+@traced
 def add_pointer(pointer_data):
     db = get_database()
     pointers_collection = db["pointers"]
     result = pointers_collection.insert_one(pointer_data)
     return str(result.inserted_id)
 
+@traced
 def get_all_pointers():
     db = get_database()
     pointers_collection = db["pointers"]
     return list(pointers_collection.find())
 
+def build_pointer_filter(year=None, status=None, language=None):
+    """
+    Builds a pointers query for the given year, compliance status and language (None means any).
+    """
+    query = {}
+    if year is not None:
+        # Pointers have stored the year both as an integer and as a string
+        query["year"] = {"$in": [int(year), str(year)]}
+    if status is not None:
+        query["compliance_status"] = status
+    if language is not None:
+        query["language"] = language
+    return query
+
+def iter_pointers(year=None, status=None, language=None, projection=None, sort=None, batch_size=100):
+    """
+    Streams pointers matching the filters without materializing the result set.
+    """
+    db = get_database()
+    pointers_collection = db["pointers"]
+    return iter_documents(
+        pointers_collection, build_pointer_filter(year, status, language),
+        projection=projection, sort=sort, batch_size=batch_size
+    )
+
+@traced
+def get_pointers_page(year=None, status=None, language=None, projection=None, sort_field="_id", descending=False, after=None, limit=20):
+    """
+    Returns one keyset-paginated page of pointers and the key of the next page (None on the last page).
+    """
+    db = get_database()
+    pointers_collection = db["pointers"]
+    return find_page(
+        pointers_collection, build_pointer_filter(year, status, language), projection=projection,
+        sort_field=sort_field, descending=descending, after=after, limit=limit
+    )
+
+@traced
+def count_pointers():
+    db = get_database()
+    pointers_collection = db["pointers"]
+    return pointers_collection.count_documents({})
+
+@traced
+def get_pointers_with_document_summaries(skip=0, limit=20):
+    """
+    Returns one page of pointers, each with a "documents" list holding only the name and size
+    of its documents, in a single aggregation. Document bytes are never read.
+    """
+    db = get_database()
+    pointers_collection = db["pointers"]
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "documents",
+            "let": {"pointer_id": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$pointer_id", "$$pointer_id"]}}},
+                {"$project": {
+                    "document_name": 1,
+                    "preprocess_status": 1,
+                    # Documents stored inline before the blob store have no size field
+                    "size": {"$ifNull": ["$size", {"$binarySize": "$document_data"}]}
+                }}
+            ],
+            "as": "documents"
+        }}
+    ]
+    return list(pointers_collection.aggregate(pipeline))
+
+@traced
+def get_pointer(pointer_id):
+    db = get_database()
+    pointers_collection = db["pointers"]
+    return pointers_collection.find_one({"_id": ObjectId(pointer_id)})
+
+@traced
 def update_pointer(pointer_id, updates):
     db = get_database()
     pointers_collection = db["pointers"]
@@ -20,6 +102,26 @@ def update_pointer(pointer_id, updates):
     )
     return result.modified_count
 
+@traced
+def update_pointer_statuses(statuses):
+    """
+    Sets the compliance status of several pointers ({pointer_id: status}) with one update per
+    distinct status, since a batch only ever produces a handful of them.
+    """
+    pointer_ids_by_status = {}
+    for pointer_id, status in statuses.items():
+        pointer_ids_by_status.setdefault(status, []).append(ObjectId(pointer_id))
+    db = get_database()
+    pointers_collection = db["pointers"]
+    modified = 0
+    for status, pointer_ids in pointer_ids_by_status.items():
+        result = pointers_collection.update_many(
+            {"_id": {"$in": pointer_ids}}, {"$set": {"compliance_status": status}}
+        )
+        modified += result.modified_count
+    return modified
+
+@traced
 def delete_pointer(pointer_id):
     db = get_database()
     pointers_collection = db["pointers"]
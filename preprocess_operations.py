@@ -0,0 +1,117 @@
+from db_connection import get_database, record_cache_write
+from tracing import traced
+from datetime import datetime
+import hashlib
+import numpy as np
+
+# Evidence text and query embeddings computed when a document is uploaded, keyed by the
+# document's content hash so every copy of the same file shares them
+
+# Query unit vectors per stored entry: 256 x 3072 float32 is 3 MB, well under MongoDB's 16 MB document limit
+QUERY_VECTOR_BATCH = 256
+
+@traced
+def get_document_text(content_hash, ocr_model, prompt_version):
+    """
+    Retrieves the text extracted from a document at upload time or by an earlier check, or None
+    if there is none (or it was extracted with another OCR model or prompt, or was evicted).
+    """
+    db = get_database()
+    text_collection = db["document_text"]
+    return text_collection.find_one_and_update(
+        {"_id": content_hash, "ocr_model": ocr_model, "prompt_version": prompt_version},
+        {"$set": {"last_used": datetime.now()}},
+        projection={"text": 1, "pages": 1}
+    )
+
+@traced
+def save_document_text(content_hash, text, pages, ocr_model, prompt_version, max_text_bytes):
+    """
+    Stores the full text of a document, one entry per content hash, and evicts the least
+    recently used entries once the stored text grows beyond max_text_bytes. An evicted
+    document is extracted again, mostly from the OCR page cache, on its next check.
+    """
+    db = get_database()
+    text_collection = db["document_text"]
+    now = datetime.now()
+    size = len(text.encode("utf-8"))
+    replaced = text_collection.find_one_and_replace(
+        {"_id": content_hash},
+        {
+            "text": text,
+            "pages": pages,
+            "ocr_model": ocr_model,
+            "prompt_version": prompt_version,
+            "size": size,
+            "created_at": now,
+            "last_used": now
+        },
+        projection={"size": 1},
+        upsert=True
+    )
+    return record_cache_write(db, "document_text", size - (replaced["size"] if replaced else 0), max_text_bytes)
+
+def _vectors_key(content_hash, embeddings_id, query_chars, units):
+    digest = hashlib.sha256("\0".join(units).encode("utf-8")).hexdigest()[:16]
+    return f"{content_hash}:{embeddings_id}:{query_chars}:{digest}"
+
+@traced
+def get_query_vectors(content_hashes, embeddings_id, query_chars):
+    """
+    Retrieves the precomputed query unit embeddings of the given documents for one embedding
+    model and query unit size. Returns a dict mapping unit text to its vector.
+    """
+    if not content_hashes:
+        return {}
+    db = get_database()
+    vectors_collection = db["document_embeddings"]
+    entries = list(vectors_collection.find(
+        {"content_hash": {"$in": list(content_hashes)}, "embeddings": embeddings_id, "query_chars": query_chars},
+        {"units": 1, "vectors": 1, "dimension": 1}
+    ))
+    if entries:
+        vectors_collection.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in entries]}},
+            {"$set": {"last_used": datetime.now()}}
+        )
+    vectors = {}
+    for entry in entries:
+        matrix = np.frombuffer(entry["vectors"], dtype="float32").reshape(len(entry["units"]), entry["dimension"])
+        vectors.update(zip(entry["units"], matrix))
+    return vectors
+
+@traced
+def save_query_vectors(content_hash, embeddings_id, query_chars, units, vectors, max_vectors_bytes):
+    """
+    Stores the embeddings of a document's query units as float32 blobs of at most
+    QUERY_VECTOR_BATCH units each, and evicts the least recently used entries once the stored
+    vectors grow beyond max_vectors_bytes.
+    """
+    db = get_database()
+    vectors_collection = db["document_embeddings"]
+    matrix = np.asarray(vectors, dtype="float32")
+    units = list(units)
+    now = datetime.now()
+    size_delta = 0
+    for start in range(0, len(units), QUERY_VECTOR_BATCH):
+        batch_units = units[start:start + QUERY_VECTOR_BATCH]
+        batch = matrix[start:start + QUERY_VECTOR_BATCH]
+        size = batch.nbytes + sum(len(unit.encode("utf-8")) for unit in batch_units)
+        replaced = vectors_collection.find_one_and_replace(
+            {"_id": _vectors_key(content_hash, embeddings_id, query_chars, batch_units)},
+            {
+                "content_hash": content_hash,
+                "embeddings": embeddings_id,
+                "query_chars": query_chars,
+                "units": batch_units,
+                "dimension": batch.shape[1] if batch.ndim == 2 else 0,
+                "vectors": batch.tobytes(),
+                "size": size,
+                "created_at": now,
+                "last_used": now
+            },
+            projection={"size": 1},
+            upsert=True
+        )
+        size_delta += size - (replaced.get("size", 0) if replaced else 0)
+    return record_cache_write(db, "document_embeddings", size_delta, max_vectors_bytes)
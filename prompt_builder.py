@@ -0,0 +1,104 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "o200k_base"  # gpt-4o / gpt-4o-mini
+# Input tokens for one compliance prompt, leaving room in the 128k window for the answer
+DEFAULT_MAX_PROMPT_TOKENS = 24000
+# Share of the space left after the fixed sections that retrieved chunks may take before the evidence text
+DEFAULT_CHUNK_SHARE = 0.6
+# A chunk is cut to fit only if at least this many tokens of it still fit
+MIN_PARTIAL_CHUNK_TOKENS = 64
+TRUNCATION_MARKER = "\n[... truncated to fit the prompt budget ...]"
+
+
+class _ApproximateEncoding:
+    """Stand-in used when tiktoken cannot load its BPE files (e.g. offline): about 4 characters per token."""
+
+    name = "approximate"
+
+    def encode(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name=DEFAULT_ENCODING):
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Could not load tiktoken encoding %s (%s); estimating tokens from length", name, e)
+        return _ApproximateEncoding()
+
+
+def count_tokens(text, encoding):
+    return len(encoding.encode(text or ""))
+
+
+def truncate(text, max_tokens, encoding):
+    """Cut text to at most max_tokens, marking the cut. Returns (text, tokens)."""
+    if max_tokens <= 0:
+        return "", 0
+    tokens = encoding.encode(text or "")
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    marker_tokens = count_tokens(TRUNCATION_MARKER, encoding)
+    cut = encoding.decode(tokens[:max(max_tokens - marker_tokens, 0)]) + TRUNCATION_MARKER
+    return cut, count_tokens(cut, encoding)
+
+
+def build_prompt_inputs(template, fixed_sections, chunks, evidence_text, format_chunk,
+                        max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS, chunk_share=DEFAULT_CHUNK_SHARE,
+                        encoding_name=DEFAULT_ENCODING):
+    """
+    Fill a prompt template within a token budget.
+
+    fixed_sections ({variable: text}) are always included, cut down only if they alone exceed half of
+    the budget. Retrieved chunks, best first, then fill up to chunk_share of the remaining space; the
+    evidence text gets the rest (plus whatever the chunks left unused) and is truncated if longer.
+    Returns (template variables with "formatted_chunks" and "evidence_text" set, token breakdown).
+    """
+    encoding = get_encoding(encoding_name)
+    empty_inputs = {name: "" for name in template.input_variables}
+    breakdown = {"template": count_tokens(template.format(**empty_inputs), encoding)}
+    inputs = {}
+
+    fixed_budget = max(max_prompt_tokens // 2 - breakdown["template"], 0)
+    for name, text in fixed_sections.items():
+        inputs[name], breakdown[name] = truncate(text, fixed_budget // max(len(fixed_sections), 1), encoding)
+    remaining = max(max_prompt_tokens - sum(breakdown.values()), 0)
+
+    # Chunks by relevance until their share is used; the last one may be cut if enough of it fits
+    chunk_budget = int(remaining * chunk_share)
+    included, chunk_tokens = [], 0
+    for chunk in chunks:
+        text = format_chunk(chunk)
+        tokens = count_tokens(text, encoding) + 1
+        if chunk_tokens + tokens > chunk_budget:
+            room = chunk_budget - chunk_tokens - 1
+            if room >= MIN_PARTIAL_CHUNK_TOKENS:
+                text, tokens = truncate(text, room, encoding)
+                included.append(text)
+                chunk_tokens += tokens + 1
+            break
+        included.append(text)
+        chunk_tokens += tokens
+    inputs["formatted_chunks"] = "\n".join(included)
+    breakdown["chunks"] = chunk_tokens
+    breakdown["chunks_included"] = len(included)
+    breakdown["chunks_dropped"] = len(chunks) - len(included)
+
+    evidence_budget = remaining - chunk_tokens
+    inputs["evidence_text"], breakdown["evidence"] = truncate((evidence_text or "").strip(), evidence_budget, encoding)
+    breakdown["evidence_truncated"] = breakdown["evidence"] < count_tokens((evidence_text or "").strip(), encoding)
+
+    breakdown["total"] = count_tokens(template.format(**inputs), encoding)
+    breakdown["budget"] = max_prompt_tokens
+    breakdown["encoding"] = encoding.name
+    logger.info("Compliance prompt tokens: %s", breakdown)
+    return inputs, breakdown
@@ -0,0 +1,124 @@
+import re
+
+import numpy as np
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from tracing import span
+
+# Characters per query unit: long enough to carry a clause, far below the embedding input limit
+DEFAULT_QUERY_CHARS = 1500
+DEFAULT_MAX_QUERIES = 48
+DEFAULT_K_PER_QUERY = 5
+DEFAULT_TOP_K = 8
+# Reciprocal rank fusion constant; larger values flatten the weight of the top ranks
+RRF_K = 60
+
+SENTENCE_END = re.compile(r"(?<=[.!?؟。])\s+")
+LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)]|[a-zA-Z][.)])\s+")
+
+
+def _pack(pieces, max_chars):
+    """Greedily join pieces into units of at most max_chars, hard-splitting pieces that are longer."""
+    units, current = [], ""
+    for piece in pieces:
+        while len(piece) > max_chars:
+            cut = piece.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                units.append(current)
+                current = ""
+            units.append(piece[:cut].strip())
+            piece = piece[cut:].strip()
+        if current and len(current) + len(piece) + 1 > max_chars:
+            units.append(current)
+            current = ""
+        current = f"{current} {piece}".strip()
+    if current:
+        units.append(current)
+    return [unit for unit in units if unit]
+
+
+def split_text(text, max_chars=DEFAULT_QUERY_CHARS):
+    """Split text into query units along paragraphs, then sentences, each at most max_chars long."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = " ".join(paragraph.split())
+        if paragraph:
+            units.extend(_pack(SENTENCE_END.split(paragraph), max_chars))
+    return units
+
+
+def split_requirements(requirements, max_chars=DEFAULT_QUERY_CHARS):
+    """Split compliance requirements into one query per line or list item."""
+    items = [LIST_ITEM.sub("", line).strip() for line in (requirements or "").splitlines()]
+    items = [item for item in items if item]
+    if len(items) <= 1:
+        return split_text(requirements, max_chars)
+    return [unit for item in items for unit in _pack([item], max_chars)]
+
+
+def build_queries(evidence_text, requirements, max_chars=DEFAULT_QUERY_CHARS, max_queries=DEFAULT_MAX_QUERIES):
+    """
+    Build the query units for one compliance check: every requirement, then evidence units.
+    When there are more evidence units than fit in max_queries they are sampled evenly across the text.
+    """
+    queries = split_requirements(requirements, max_chars)[:max_queries]
+    evidence = split_text(evidence_text, max_chars)
+    room = max_queries - len(queries)
+    if room > 0 and len(evidence) > room:
+        step = len(evidence) / room
+        evidence = [evidence[int(i * step)] for i in range(room)]
+    queries.extend(evidence[:max(room, 0)])
+    # Duplicate units (repeated headers, boilerplate) would only repeat the same search
+    return list(dict.fromkeys(queries))
+
+
+def embeddings_id(embeddings):
+    """Identify the vectors an embedding model produces (model and output size), e.g. to key stored query vectors."""
+    model = getattr(embeddings, "model", type(embeddings).__name__)
+    return f"{model}:{getattr(embeddings, 'dimensions', None) or 'native'}"
+
+
+def multi_query_search(vector_store, queries, k_per_query=DEFAULT_K_PER_QUERY, top_k=DEFAULT_TOP_K, rrf_k=RRF_K,
+                       known_vectors=None):
+    """
+    Embed all queries in one batched call, run one batched FAISS search and merge the hits with
+    reciprocal rank fusion. Returns up to top_k chunks, best first, as dicts with the chunk content,
+    its best raw score ("score", as in similarity_search_with_score), the fused score and the
+    number of queries that retrieved it.
+    known_vectors ({query text: vector} from the same embedding model) are used instead of
+    embedding those queries again.
+    """
+    if not queries:
+        return []
+    known_vectors = known_vectors or {}
+    missing = [query for query in queries if query not in known_vectors]
+    with span("retrieval.embed", queries=len(missing), reused=len(queries) - len(missing)):
+        embedded = dict(zip(missing, vector_store.embeddings.embed_documents(missing))) if missing else {}
+        vectors = np.asarray(
+            [known_vectors[query] if query in known_vectors else embedded[query] for query in queries], dtype="float32"
+        )
+    if getattr(vector_store, "_normalize_L2", False):
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    with span("retrieval.search"):
+        distances, labels = vector_store.index.search(vectors, k_per_query)
+    best = max if vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT else min
+
+    fused = {}
+    for row_distances, row_labels in zip(distances, labels):
+        for rank, (distance, label) in enumerate(zip(row_distances, row_labels)):
+            if label == -1:
+                continue
+            entry = fused.setdefault(int(label), {"fusion_score": 0.0, "score": float(distance), "hits": 0})
+            entry["fusion_score"] += 1.0 / (rrf_k + rank + 1)
+            entry["score"] = best(entry["score"], float(distance))
+            entry["hits"] += 1
+
+    results = []
+    for label, entry in sorted(fused.items(), key=lambda item: item[1]["fusion_score"], reverse=True)[:top_k]:
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[label])
+        if isinstance(doc, str):
+            # Mapping and docstore disagree; skip rather than fail the check
+            continue
+        results.append({"content": doc.page_content, "metadata": doc.metadata, **entry})
+    return results
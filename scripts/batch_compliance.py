@@ -0,0 +1,126 @@
+"""
+Runs compliance checks for every pointer matching a year / language / status without the UI.
+
+Run from the repository root so .streamlit/secrets.toml is picked up:
+    python scripts/batch_compliance.py --year 2024 [--language English] [--status "Not Checked"]
+        [--ocr-workers 2] [--retrieval-workers 4] [--llm-workers 4] [--flush-size 20] [--run-id ID] [--no-llm-cache]
+
+Pointers run concurrently through OCR, retrieval and the LLM verdict, with a separate concurrency
+limit per stage; OCR requests from all pointers share the [ocr] rate limits. Results are written in
+bulk every --flush-size pointers and tagged with the run id. After a crash, re-run with the printed
+--run-id to skip the pointers whose results were already written.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streamlit as st  # noqa: E402
+from langchain_openai.chat_models import ChatOpenAI  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+from compliance_operations import add_compliance_results, get_checked_pointer_ids  # noqa: E402
+from compliance_pipeline import LLM_MODEL, load_settings, check_pointer  # noqa: E402
+from ocr_engine import RateLimiter  # noqa: E402
+from pointer_operations import iter_pointers, update_pointer_statuses  # noqa: E402
+from vector_store_registry import get_vector_store_registry  # noqa: E402
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+POINTER_PROJECTION = {
+    "name": 1, "year": 1, "language": 1, "compliance_requirements": 1, "supporting_document_points": 1
+}
+
+
+def flush(results, run_id):
+    """Write buffered results and pointer statuses in two bulk operations."""
+    if not results:
+        return
+    for result in results:
+        result["metadata"]["run_id"] = run_id
+    add_compliance_results(results)
+    update_pointer_statuses({result["pointer_id"]: result["compliance_status"] for result in results})
+    results.clear()
+
+
+def run(args):
+    settings = load_settings(st.secrets)
+    # One rate budget for the whole run instead of one per document
+    settings["ocr"]["limiter"] = RateLimiter(
+        settings["ocr"]["requests_per_minute"], settings["ocr"]["tokens_per_minute"]
+    )
+    api_key = st.secrets["openai"]["OPENAI_API_KEY"]
+    client = OpenAI(api_key=api_key)
+    llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=api_key)
+    registry = get_vector_store_registry()
+
+    run_id = args.run_id or uuid.uuid4().hex
+    done = get_checked_pointer_ids(run_id)
+    pointers = [
+        pointer for pointer in iter_pointers(args.year, args.status, args.language, projection=POINTER_PROJECTION)
+        if pointer["_id"] not in done
+    ]
+    print(f"Run {run_id}: {len(pointers)} pointer(s) to check, {len(done)} already done")
+    print(f"Resume with --run-id {run_id}")
+    if args.dry_run or not pointers:
+        return
+
+    stages = {
+        "ocr": threading.BoundedSemaphore(args.ocr_workers),
+        "retrieval": threading.BoundedSemaphore(args.retrieval_workers),
+        "llm": threading.BoundedSemaphore(args.llm_workers),
+    }
+    # Enough threads to keep every stage busy at once; a pointer holds a stage's slot only while in it
+    workers = args.ocr_workers + args.retrieval_workers + args.llm_workers
+    buffer, failed, checked = [], 0, 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pointer") as executor:
+        futures = {
+            executor.submit(
+                check_pointer, pointer, client, llm, registry, settings, stages.get, args.no_llm_cache
+            ): pointer
+            for pointer in pointers
+        }
+        for future in as_completed(futures):
+            pointer = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED {pointer.get('name', pointer['_id'])}: {e}")
+                continue
+            checked += 1
+            buffer.append(result)
+            print(f"  [{checked + failed}/{len(pointers)}] {pointer.get('name', pointer['_id'])}: {result['compliance_status']}")
+            if len(buffer) >= args.flush_size:
+                flush(buffer, run_id)
+    flush(buffer, run_id)
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked {checked} pointer(s), {failed} failed, in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--language")
+    parser.add_argument("--status", help='Only pointers with this compliance status, e.g. "Not Checked"')
+    parser.add_argument("--ocr-workers", type=int, default=2)
+    parser.add_argument("--retrieval-workers", type=int, default=4)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--flush-size", type=int, default=20, help="Results written per bulk write")
+    parser.add_argument("--run-id", help="Resume an earlier run")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Ask the model again even for cached prompts")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the pointers to check")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
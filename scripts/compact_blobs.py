@@ -0,0 +1,138 @@
+"""
+Deduplicates and garbage-collects the document blob store.
+
+Run from the repository root so .streamlit/secrets.toml is picked up:
+    python scripts/compact_blobs.py [--grace-hours 24] [--dry-run]
+
+1. Compaction: documents whose blob is not the shared blob for their content hash (uploaded before
+   blobs were shared) take a reference on the shared one; the first such document registers its blob.
+2. Reference counts untouched for --grace-hours are recounted from the documents collection.
+3. Blob entries without references, and stored blobs that no entry or document points to, are deleted
+   once older than --grace-hours, so uploads still in flight are never touched.
+4. Text and query embeddings preprocessed for content that no document refers to any more are deleted.
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from blob_operations import (  # noqa: E402
+    get_blob, acquire_blob, register_blob, release_blob, iter_blobs, set_blob_refcount, delete_blob_entry
+)
+from blob_store import get_blob_store  # noqa: E402
+from db_connection import get_database, iter_documents  # noqa: E402
+
+
+def compact_documents(db, blob_store, dry_run):
+    """Point every document at the shared blob of its content. Returns the number of documents changed."""
+    documents_collection = db["documents"]
+    changed = 0
+    query = {"blob_id": {"$exists": True}, "content_hash": {"$exists": True}}
+    projection = {"blob_id": 1, "content_hash": 1, "size": 1, "storage": 1}
+    for document in iter_documents(documents_collection, query, projection):
+        blob = get_blob(document["content_hash"])
+        if blob is not None and blob["blob_id"] == document["blob_id"]:
+            continue
+        changed += 1
+        if dry_run:
+            continue
+        # Take the document's reference first, as an upload does; if it registered its own blob there is nothing to move
+        blob = acquire_blob(document["content_hash"]) or register_blob(
+            document["content_hash"], document.get("storage", blob_store.name), document["blob_id"], document.get("size")
+        )
+        if blob["blob_id"] == document["blob_id"]:
+            continue
+        # The old copy is left to the orphan sweep, which only deletes it once nothing points to it
+        result = documents_collection.update_one(
+            {"_id": document["_id"], "blob_id": document["blob_id"]},
+            {"$set": {"blob_id": blob["blob_id"], "storage": blob["storage"], "size": blob["size"]}}
+        )
+        if not result.modified_count:
+            # Deleted or changed meanwhile; give the reference back
+            unreferenced = release_blob(document["content_hash"])
+            if unreferenced is not None:
+                blob_store.delete(unreferenced["blob_id"])
+    return changed
+
+
+def recount_references(db, grace, dry_run):
+    """Fix reference counts of blobs not acquired or released within grace. Returns the number fixed."""
+    documents_collection = db["documents"]
+    cutoff = datetime.now() - grace
+    fixed = 0
+    for blob in iter_blobs():
+        if max(blob.get("last_acquired") or datetime.min, blob.get("last_released") or datetime.min) > cutoff:
+            continue
+        refcount = documents_collection.count_documents({"content_hash": blob["_id"], "blob_id": blob["blob_id"]})
+        if refcount != blob.get("refcount"):
+            print(f"{blob['_id'][:12]}: refcount {blob.get('refcount')} -> {refcount}")
+            fixed += 1
+            if not dry_run:
+                set_blob_refcount(blob["_id"], refcount)
+    return fixed
+
+
+def sweep(db, blob_store, grace, dry_run):
+    """Delete unreferenced blob entries and stored blobs older than grace. Returns the numbers of entries and blobs freed."""
+    documents_collection = db["documents"]
+    cutoff = datetime.now() - grace
+    freed_entries = 0
+    for blob in iter_blobs({"refcount": {"$lte": 0}}):
+        if max(blob.get("last_acquired") or datetime.min, blob.get("last_released") or datetime.min) > cutoff:
+            continue
+        freed_entries += 1
+        if not dry_run:
+            delete_blob_entry(blob["_id"])
+
+    referenced = {str(blob["blob_id"]) for blob in iter_blobs()}
+    referenced.update(
+        str(document["blob_id"])
+        for document in iter_documents(documents_collection, {"blob_id": {"$exists": True}}, {"blob_id": 1})
+    )
+    freed_blobs = 0
+    # Stored blob times are UTC
+    utc_cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - grace
+    for blob_id, stored_at in blob_store.iter_blob_ids():
+        if str(blob_id) in referenced or stored_at > utc_cutoff:
+            continue
+        freed_blobs += 1
+        if not dry_run:
+            blob_store.delete(blob_id)
+    return freed_entries, freed_blobs
+
+
+def sweep_preprocessed(db, dry_run):
+    """Delete preprocessed text and embeddings of content no document refers to. Returns the number of entries."""
+    live_hashes = set(db["documents"].distinct("content_hash"))
+    removed = 0
+    for collection_name, field in (("document_text", "_id"), ("document_embeddings", "content_hash")):
+        collection = db[collection_name]
+        stale = [entry["_id"] for entry in collection.find({}, {field: 1}) if entry.get(field) not in live_hashes]
+        removed += len(stale)
+        if stale and not dry_run:
+            collection.delete_many({"_id": {"$in": stale}})
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grace-hours", type=float, default=24, help="Leave blobs and counts touched this recently alone")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    db = get_database()
+    blob_store = get_blob_store()
+    grace = timedelta(hours=args.grace_hours)
+    prefix = "[dry run] " if args.dry_run else ""
+
+    print(f"{prefix}{compact_documents(db, blob_store, args.dry_run)} document(s) pointed at a shared blob")
+    print(f"{prefix}{recount_references(db, grace, args.dry_run)} reference count(s) corrected")
+    entries, blobs = sweep(db, blob_store, grace, args.dry_run)
+    print(f"{prefix}{entries} unreferenced blob entr(ies) and {blobs} orphaned blob(s) deleted")
+    print(f"{prefix}{sweep_preprocessed(db, args.dry_run)} preprocessed entr(ies) of deleted content removed")
+
+
+if __name__ == "__main__":
+    main()
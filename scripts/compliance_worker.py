@@ -0,0 +1,207 @@
+"""
+Background worker for compliance checks queued from the analysis page ([jobs] enabled = true) and
+for documents preprocessed on upload ([preprocessing] enabled = true).
+
+Run from the repository root so .streamlit/secrets.toml is picked up:
+    python scripts/compliance_worker.py [--processes 2] [--poll-interval 2] [--stale-after 900] [--max-attempts 3]
+
+Each process claims one queued job at a time from the compliance_jobs collection, reports the stage
+it is in (ocr, retrieval, llm) and stores the result like the page does. Preprocessing jobs extract a
+document's text and embed its query units (stages ocr, embedding) so later checks start warm.
+A running job gets a heartbeat every --stale-after / 3 seconds; jobs whose worker stopped
+reporting for --stale-after seconds are put back in the queue, or failed once they have been
+claimed --max-attempts times. A worker that finds its job taken over discards its own result.
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from multiprocessing import get_context
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streamlit as st  # noqa: E402
+from langchain_openai.chat_models import ChatOpenAI  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+from compliance_operations import add_compliance_result, delete_compliance_result  # noqa: E402
+from compliance_pipeline import LLM_MODEL, load_settings, check_pointer, preprocess_document  # noqa: E402
+from document_operations import get_document, set_preprocess_status  # noqa: E402
+from job_operations import (  # noqa: E402
+    DEFAULT_MAX_ATTEMPTS, claim_next_job, update_job_progress, heartbeat_job, complete_job, fail_job, requeue_stale_jobs
+)
+from pointer_operations import get_pointer, update_pointer  # noqa: E402
+from vector_store_registry import get_vector_store_registry  # noqa: E402
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+# Minimum seconds between writes of the partially streamed verdict to the job
+PARTIAL_OUTPUT_INTERVAL = 1.0
+
+
+class JobLostError(RuntimeError):
+    """The job was requeued and claimed by another worker while this one was still running it."""
+
+
+class Heartbeat:
+    """
+    Refreshes a claimed job's updated_at from a background thread while it runs, so a long
+    rate-limited stage is not mistaken for a dead worker. Stops once the job is no longer ours.
+    """
+
+    def __init__(self, job_id, worker_id, interval):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if not heartbeat_job(self.job_id, self.worker_id):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def job_stage(job_id, worker_id):
+    """Stage callback for the pipeline that reports progress and stops if the job was taken over."""
+    def stage(name):
+        if not update_job_progress(job_id, worker_id, name):
+            raise JobLostError("job was taken over by another worker")
+        return nullcontext()
+    return stage
+
+
+def run_job(job, worker_id, client, llm, registry, settings):
+    """Check the job's pointer, reporting each stage, and store the result."""
+    job_id = job["_id"]
+    pointer = get_pointer(job["pointer_id"])
+    if pointer is None:
+        raise ValueError("pointer no longer exists")
+
+    # Publish the verdict as it streams so the page can show it before the job finishes
+    partial = {"text": "", "written_at": 0.0}
+
+    def on_chunk(piece):
+        partial["text"] += piece
+        if time.monotonic() - partial["written_at"] >= PARTIAL_OUTPUT_INTERVAL:
+            if not update_job_progress(job_id, worker_id, "llm", partial_output=partial["text"]):
+                raise JobLostError("job was taken over by another worker")
+            partial["written_at"] = time.monotonic()
+
+    result = check_pointer(
+        pointer, client, llm, registry, settings, stage=job_stage(job_id, worker_id),
+        bypass_cache=job.get("bypass_cache", False), on_chunk=on_chunk
+    )
+    if not heartbeat_job(job_id, worker_id):
+        raise JobLostError("job was taken over by another worker")
+    result_id = add_compliance_result(
+        result["pointer_id"], result["compliance_status"], result["details"],
+        metadata={**result["metadata"], "job_id": job_id}
+    )
+    if not complete_job(job_id, worker_id, result_id, result["compliance_status"]):
+        # Lost the job between the check above and now; the other worker stores the result
+        delete_compliance_result(result_id)
+        raise JobLostError("job was taken over by another worker")
+    update_pointer(pointer["_id"], {"compliance_status": result["compliance_status"]})
+    return result["compliance_status"]
+
+
+def run_preprocess_job(job, worker_id, client, registry, settings):
+    """Extract and embed an uploaded document, marking every copy of it with the outcome."""
+    job_id = job["_id"]
+    set_preprocess_status(job["content_hash"], "running")
+    try:
+        document = get_document(job["document_id"])
+        if document is None:
+            raise ValueError("document no longer exists")
+        pointer = get_pointer(document["pointer_id"])
+        vector_store = registry.get(pointer.get("year"), pointer["language"]) if pointer else None
+        summary = preprocess_document(
+            document, client, vector_store, settings, stage=job_stage(job_id, worker_id),
+            requirements=pointer.get("compliance_requirements", "") if pointer else ""
+        )
+    except JobLostError:
+        raise
+    except Exception as e:
+        set_preprocess_status(job["content_hash"], "failed", e)
+        raise
+    # Text and vectors are stored per content hash, so a worker that lost the job wrote the same data
+    if not complete_job(job_id, worker_id):
+        raise JobLostError("job was taken over by another worker")
+    set_preprocess_status(job["content_hash"], "done")
+    return f"preprocessed {summary['pages']} page(s), {summary['query_units']} query unit(s)"
+
+
+def worker_loop(worker_number, poll_interval, stale_after, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Claim and run jobs until interrupted. Runs in its own process with its own clients."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    settings = load_settings(st.secrets)
+    api_key = st.secrets["openai"]["OPENAI_API_KEY"]
+    client = OpenAI(api_key=api_key)
+    llm = ChatOpenAI(model=LLM_MODEL, openai_api_key=api_key)
+    registry = get_vector_store_registry()
+    print(f"[worker {worker_number}] {worker_id} started")
+
+    while True:
+        job = claim_next_job(worker_id)
+        if job is None:
+            requeued, failed = requeue_stale_jobs(stale_after, max_attempts)
+            if requeued or failed:
+                print(f"[worker {worker_number}] requeued {requeued} and failed {failed} stale job(s)")
+            time.sleep(poll_interval)
+            continue
+        start = time.perf_counter()
+        try:
+            with Heartbeat(job["_id"], worker_id, stale_after / 3):
+                if job.get("type") == "preprocess":
+                    status = run_preprocess_job(job, worker_id, client, registry, settings)
+                else:
+                    status = run_job(job, worker_id, client, llm, registry, settings)
+            print(f"[worker {worker_number}] job {job['_id']}: {status} in {time.perf_counter() - start:.1f}s")
+        except JobLostError as e:
+            print(f"[worker {worker_number}] job {job['_id']} abandoned: {e}")
+        except Exception as e:
+            fail_job(job["_id"], e, worker_id)
+            print(f"[worker {worker_number}] job {job['_id']} failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between queue polls when idle")
+    parser.add_argument("--stale-after", type=int, default=900, help="Seconds without a heartbeat before a job is requeued")
+    parser.add_argument(
+        "--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Claims of a stale job before it is failed instead"
+    )
+    args = parser.parse_args()
+
+    # Spawn rather than fork so every process opens its own MongoDB and HTTP connections
+    context = get_context("spawn")
+    processes = [
+        context.Process(target=worker_loop, args=(number, args.poll_interval, args.stale_after, args.max_attempts), daemon=True)
+        for number in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Converts vector stores saved with FAISS.save_local (index.faiss + pickled index.pkl) to the
+SQLite docstore read by vector_index.load_vector_store.
+
+    python scripts/convert_faiss_docstore.py pages/faiss_indexes/2024/English pages/faiss_indexes/2024/Arabic
+
+The pickle is unpickled once here, so only run this on index directories you produced yourself.
+Pass --remove-pickle to delete index.pkl afterwards.
+"""
+import argparse
+import os
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlite_docstore import DOCSTORE_FILE, write_docstore  # noqa: E402
+
+
+def convert(directory, remove_pickle):
+    pickle_path = os.path.join(directory, "index.pkl")
+    with open(pickle_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    write_docstore(os.path.join(directory, DOCSTORE_FILE), docstore._dict, index_to_docstore_id)
+    print(f"{directory}: wrote {len(docstore._dict)} chunks to {DOCSTORE_FILE}")
+    if remove_pickle:
+        os.remove(pickle_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directories", nargs="+")
+    parser.add_argument("--remove-pickle", action="store_true")
+    args = parser.parse_args()
+    for directory in args.directories:
+        convert(directory, args.remove_pickle)
+
+
+if __name__ == "__main__":
+    main()
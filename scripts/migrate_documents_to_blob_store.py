@@ -0,0 +1,73 @@
+"""
+Moves document bytes stored inline in the documents collection into the configured blob store.
+
+Run from the repository root so .streamlit/secrets.toml is picked up:
+    python scripts/migrate_documents_to_blob_store.py [--batch-size 20] [--dry-run]
+
+Each document is migrated independently: its bytes are streamed to the blob store (or share the blob
+already stored for the same content), the blob reference, size and content hash are set and
+document_data is removed. Re-running is safe.
+"""
+import argparse
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from blob_operations import release_blob  # noqa: E402
+from blob_store import get_blob_store  # noqa: E402
+from db_connection import get_database  # noqa: E402
+from document_operations import store_blob  # noqa: E402
+
+
+def migrate(batch_size, dry_run):
+    db = get_database()
+    documents_collection = db["documents"]
+    blob_store = get_blob_store()
+    legacy_filter = {"document_data": {"$exists": True}, "blob_id": {"$exists": False}}
+
+    print(f"{documents_collection.count_documents(legacy_filter)} document(s) to migrate to '{blob_store.name}'")
+    if dry_run:
+        return
+
+    migrated = 0
+    # Fetch ids first and the bytes of one document at a time to keep memory flat
+    for entry in documents_collection.find(legacy_filter, {"_id": 1}).batch_size(batch_size):
+        document = documents_collection.find_one({"_id": entry["_id"]}, {"document_name": 1, "document_data": 1})
+        if not document or "document_data" not in document:
+            continue
+        blob = store_blob(io.BytesIO(document["document_data"]), document["document_name"])
+        result = documents_collection.update_one(
+            {"_id": document["_id"], "blob_id": {"$exists": False}},
+            {
+                "$set": {
+                    "storage": blob["storage"],
+                    "blob_id": blob["blob_id"],
+                    "size": blob["size"],
+                    "content_hash": blob["_id"],
+                },
+                "$unset": {"document_data": ""},
+            },
+        )
+        if result.modified_count:
+            migrated += 1
+            print(f"Migrated {document['document_name']} ({blob['size']} bytes)")
+        else:
+            # Another run migrated it concurrently; drop the reference taken for it
+            unreferenced = release_blob(blob["_id"])
+            if unreferenced is not None:
+                blob_store.delete(unreferenced["blob_id"])
+    print(f"Migrated {migrated} document(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents that still need migrating.")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
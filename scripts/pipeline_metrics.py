@@ -0,0 +1,154 @@
+"""
+Summarizes the per-stage timings stored on compliance results (the "trace" field).
+
+Run from the repository root so .streamlit/secrets.toml is picked up:
+    python scripts/pipeline_metrics.py [--days 7] [--limit 1000]
+    python scripts/pipeline_metrics.py --serve 9108     # Prometheus text format on /metrics
+
+For every stage (ocr, ocr.page, retrieval.embed, llm, document_operations.get_documents_by_pointer, ...)
+the time it took per check is aggregated across checks into p50 / p95 / max, with call counts and tokens.
+"""
+import argparse
+import math
+import sys
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compliance_operations import iter_compliance_results  # noqa: E402
+
+TOKEN_FIELDS = ("tokens", "prompt_tokens", "completion_tokens")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)), 1) - 1]
+
+
+def add_trace(stages, trace):
+    """Add one check's trace summary to the per-stage lists of seconds (plus the check total)."""
+    total = stages.setdefault("check.total", {"seconds": [], "calls": 0})
+    total["seconds"].append(trace["total_seconds"])
+    total["calls"] += 1
+    for stage in trace["stages"]:
+        entry = stages.setdefault(stage["name"], {"seconds": [], "calls": 0})
+        entry["seconds"].append(stage["seconds"])
+        entry["calls"] += stage["count"]
+        for field in TOKEN_FIELDS:
+            if field in stage:
+                entry[field] = entry.get(field, 0) + stage[field]
+
+
+def collect(days, limit):
+    """Per-stage lists of seconds per check (plus the check totals) from recent compliance results."""
+    since = datetime.now() - timedelta(days=days)
+    stages = {}
+    checks = 0
+    results = iter_compliance_results(projection={"trace": 1, "checked_date": 1})
+    for result in results:
+        if result.get("checked_date") and result["checked_date"] < since:
+            break  # Newest first, so everything after this is older
+        trace = result.get("trace")
+        if not trace:
+            continue
+        checks += 1
+        add_trace(stages, trace)
+        if checks >= limit:
+            break
+    return checks, stages
+
+
+def summarize(stages):
+    rows = []
+    for name, entry in stages.items():
+        seconds = entry["seconds"]
+        rows.append({
+            "stage": name,
+            "checks": len(seconds),
+            "calls": entry["calls"],
+            "p50": percentile(seconds, 0.5),
+            "p95": percentile(seconds, 0.95),
+            "max": max(seconds),
+            "tokens": sum(entry.get(field, 0) for field in TOKEN_FIELDS),
+        })
+    return sorted(rows, key=lambda row: row["p95"], reverse=True)
+
+
+def print_summary(checks, rows):
+    print(f"{checks} check(s) with timings")
+    print(f"{'stage':<55} {'checks':>6} {'calls':>7} {'p50 s':>9} {'p95 s':>9} {'max s':>9} {'tokens':>10}")
+    for row in rows:
+        print(
+            f"{row['stage']:<55} {row['checks']:>6} {row['calls']:>7} {row['p50']:>9.3f} "
+            f"{row['p95']:>9.3f} {row['max']:>9.3f} {row['tokens']:>10}"
+        )
+
+
+def prometheus_text(checks, rows):
+    lines = [
+        "# HELP compliance_stage_seconds Time spent in a pipeline stage per compliance check.",
+        "# TYPE compliance_stage_seconds summary",
+    ]
+    for row in rows:
+        for quantile in ("0.5", "0.95"):
+            value = row["p50"] if quantile == "0.5" else row["p95"]
+            lines.append(f'compliance_stage_seconds{{stage="{row["stage"]}",quantile="{quantile}"}} {value:.6f}')
+        lines.append(f'compliance_stage_seconds_count{{stage="{row["stage"]}"}} {row["checks"]}')
+    lines += [
+        "# HELP compliance_stage_calls_total Calls of a pipeline stage across the summarized checks.",
+        "# TYPE compliance_stage_calls_total counter",
+    ]
+    lines += [f'compliance_stage_calls_total{{stage="{row["stage"]}"}} {row["calls"]}' for row in rows]
+    lines += [
+        "# HELP compliance_stage_tokens_total Tokens used by a pipeline stage across the summarized checks.",
+        "# TYPE compliance_stage_tokens_total counter",
+    ]
+    lines += [f'compliance_stage_tokens_total{{stage="{row["stage"]}"}} {row["tokens"]}' for row in rows if row["tokens"]]
+    lines += [
+        "# HELP compliance_checks Compliance checks with timings in the window.",
+        "# TYPE compliance_checks gauge",
+        f"compliance_checks {checks}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, days, limit):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            checks, stages = collect(days, limit)
+            body = prometheus_text(checks, summarize(stages)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=7, help="Only checks from the last N days")
+    parser.add_argument("--limit", type=int, default=1000, help="At most this many recent checks")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Expose Prometheus metrics instead of printing")
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.days, args.limit)
+    else:
+        checks, stages = collect(args.days, args.limit)
+        print_summary(checks, summarize(stages))
+
+
+if __name__ == "__main__":
+    main()
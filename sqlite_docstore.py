@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_ids (
+    faiss_id INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL
+);
+"""
+
+
+class _ReadOnlyConnections:
+    """One read-only SQLite connection per thread, since Streamlit serves sessions from several threads."""
+
+    def __init__(self, path):
+        self.uri = Path(path).resolve().as_uri() + "?mode=ro"
+        self._local = threading.local()
+
+    def get(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.uri, uri=True)
+            self._local.connection = connection
+        return connection
+
+
+class SqliteDocstore(Docstore):
+    """
+    Read-only docstore that looks chunks up by id in a SQLite file on demand, so nothing is
+    deserialized up front and processes on the same host share the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = _ReadOnlyConnections(path)
+
+    def search(self, search):
+        row = self._connections.get().execute(
+            "SELECT page_content, metadata FROM chunks WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def __len__(self):
+        return self._connections.get().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+class SqliteIndexMapping(Mapping):
+    """Read-only FAISS id -> chunk id mapping backed by the same SQLite file."""
+
+    def __init__(self, path):
+        self._connections = _ReadOnlyConnections(path)
+
+    def __getitem__(self, faiss_id):
+        row = self._connections.get().execute(
+            "SELECT chunk_id FROM index_ids WHERE faiss_id = ?", (int(faiss_id),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(faiss_id)
+        return row[0]
+
+    def __iter__(self):
+        for (faiss_id,) in self._connections.get().execute("SELECT faiss_id FROM index_ids"):
+            yield faiss_id
+
+    def __len__(self):
+        return self._connections.get().execute("SELECT COUNT(*) FROM index_ids").fetchone()[0]
+
+
+def write_docstore(path, chunks, index_to_docstore_id):
+    """
+    Write chunks ({chunk id: Document}) and the FAISS id mapping to a SQLite file.
+    The file is built next to the target and swapped in atomically, so readers never see a partial store.
+    """
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.executemany(
+            "INSERT INTO chunks (id, page_content, metadata) VALUES (?, ?, ?)",
+            ((chunk_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)) for chunk_id, doc in chunks.items()),
+        )
+        connection.executemany(
+            "INSERT INTO index_ids (faiss_id, chunk_id) VALUES (?, ?)",
+            ((int(faiss_id), chunk_id) for faiss_id, chunk_id in index_to_docstore_id.items()),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temp_path, path)
+
+
+def read_docstore(path):
+    """Read a whole SQLite docstore into memory, for ingestion runs that modify it."""
+    connection = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        chunks = {
+            chunk_id: Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))
+            for chunk_id, content, metadata in connection.execute("SELECT id, page_content, metadata FROM chunks")
+        }
+        index_to_docstore_id = dict(connection.execute("SELECT faiss_id, chunk_id FROM index_ids"))
+    finally:
+        connection.close()
+    return chunks, index_to_docstore_id
@@ -0,0 +1,84 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Spans recorded during one compliance check. Safe to record into from several threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, attributes):
+        with self._lock:
+            self.spans.append({"name": name, "seconds": seconds, **attributes})
+
+    def summary(self):
+        """
+        Per-span-name totals for storing on a compliance result: count, total and max seconds, and
+        the sum of any numeric attributes (e.g. tokens). Stored as a list since span names contain dots.
+        """
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span_record in spans:
+            stage = stages.setdefault(span_record["name"], {"name": span_record["name"], "count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stage["count"] += 1
+            stage["seconds"] += span_record["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"], span_record["seconds"])
+            for key, value in span_record.items():
+                if key not in ("name", "seconds") and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage[key] = stage.get(key, 0) + value
+        return {"total_seconds": time.perf_counter() - self.started, "stages": list(stages.values())}
+
+
+def start_trace():
+    """Start collecting spans for the current thread (and the threads it hands work to via run_in_context)."""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace):
+    """Stop collecting and return the trace summary."""
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    return trace.summary()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block and record it on the active trace, if any. Yields a dict the block can add
+    attributes to, e.g. token counts.
+    """
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        if trace is not None:
+            trace.record(name, time.perf_counter() - start, attributes)
+
+
+def traced(func):
+    """Decorator recording each call as a span named <module>.<function>."""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def run_in_context(func):
+    """Wrap func so it runs with the caller's trace when submitted to a thread pool."""
+    context = copy_context()
+    return functools.partial(context.run, func)
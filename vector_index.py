@@ -0,0 +1,214 @@
+import json
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from sqlite_docstore import DOCSTORE_FILE, SqliteDocstore, SqliteIndexMapping, read_docstore, write_docstore
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+INDEX_CONFIG_FILE = "index_config.json"
+# Memory-map the vectors instead of copying them into each process (IVF lists and flat codes).
+# Flat codes can only be mapped by faiss builds that have IO_FLAG_MMAP_IFC (see requirements.txt)
+FLAT_CODES_MMAP = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# faiss k-means wants this many training points per centroid (IVF lists and PQ codebook entries)
+MIN_POINTS_PER_CENTROID = 39
+# Fewest bits per PQ code a small corpus may fall back to
+MIN_PQ_NBITS = 4
+
+DEFAULT_INDEX_CONFIG = {
+    "type": "flat",
+    # text-embedding-3 models can return shortened vectors; None keeps the model's native size
+    "dimensions": None,
+    # IVF: number of inverted lists (None sizes it from the corpus) and lists visited per query
+    "nlist": None,
+    "nprobe": 16,
+    # PQ: sub-quantizers per vector (must divide the dimension) and bits per code
+    "pq_m": 64,
+    "pq_nbits": 8,
+    # HNSW: graph degree and beam widths for construction and search
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    # Vectors sampled for IVF/PQ training
+    "training_sample": 50000,
+}
+
+
+def index_config(**overrides):
+    """Return the default index configuration with the given settings applied."""
+    config = dict(DEFAULT_INDEX_CONFIG)
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if config["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {config['type']!r}; expected one of {', '.join(INDEX_TYPES)}")
+    return config
+
+
+def needs_training(config):
+    return config["type"] in ("ivf_flat", "ivf_pq")
+
+
+def supports_removal(config):
+    """HNSW graphs cannot delete vectors in place; the others can."""
+    return config["type"] != "hnsw"
+
+
+def _nlist(config, vector_count):
+    if config["nlist"]:
+        return config["nlist"]
+    # Rule of thumb ~4*sqrt(n) lists, with at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(vector_count)), vector_count // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_nbits(config, vector_count):
+    """
+    Bits per PQ code the training set can support: config["pq_nbits"], lowered until each of the
+    2**nbits codebook entries gets 39 training points. Raises if even MIN_PQ_NBITS is too many.
+    """
+    nbits = config["pq_nbits"]
+    while nbits > MIN_PQ_NBITS and vector_count < MIN_POINTS_PER_CENTROID * 2 ** nbits:
+        nbits -= 1
+    if vector_count < MIN_POINTS_PER_CENTROID * 2 ** nbits:
+        raise ValueError(
+            f"An ivf_pq index needs at least {MIN_POINTS_PER_CENTROID * 2 ** nbits} training vectors, "
+            f"got {vector_count}; use ivf_flat or flat for a corpus this small"
+        )
+    if nbits != config["pq_nbits"]:
+        logger.warning(
+            "%s training vectors are too few for pq_nbits=%s; building with pq_nbits=%s",
+            vector_count, config["pq_nbits"], nbits
+        )
+    return nbits
+
+
+def build_index(config, dimension, training_vectors=None):
+    """
+    Build an empty FAISS index that accepts add_with_ids, training it first when the type needs it.
+    IVF types must be given training_vectors (a float32 array); the list count is sized from them,
+    and for ivf_pq the bits per code are lowered if there are too few of them to train the codebooks.
+    """
+    if config["type"] == "flat":
+        index = faiss.index_factory(dimension, "IDMap2,Flat")
+    elif config["type"] == "hnsw":
+        index = faiss.index_factory(dimension, f"IDMap2,HNSW{config['hnsw_m']}")
+        faiss.downcast_index(index.index).hnsw.efConstruction = config["ef_construction"]
+    else:
+        if training_vectors is None or len(training_vectors) == 0:
+            raise ValueError(f"A {config['type']} index needs training vectors")
+        nlist = _nlist(config, len(training_vectors))
+        if config["type"] == "ivf_flat":
+            description = f"IVF{nlist},Flat"
+        else:
+            if dimension % config["pq_m"]:
+                raise ValueError(f"pq_m={config['pq_m']} does not divide the dimension {dimension}")
+            description = f"IVF{nlist},PQ{config['pq_m']}x{_pq_nbits(config, len(training_vectors))}"
+        index = faiss.index_factory(dimension, description)
+        index.train(np.ascontiguousarray(training_vectors, dtype="float32"))
+    apply_search_params(index, config)
+    return index
+
+
+def sample_training_vectors(vectors, config, seed=0):
+    """Pick at most config["training_sample"] rows of a float32 array for training."""
+    if len(vectors) <= config["training_sample"]:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), config["training_sample"], replace=False)
+    return vectors[rows]
+
+
+def apply_search_params(index, config):
+    """Set the query-time knobs (nprobe / efSearch) persisted with an index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = config["nprobe"]
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config["ef_search"]
+
+
+def rebuild_without(index, config, removed_ids):
+    """
+    Return a copy of an ID-mapped index without the given ids, for index types that cannot
+    remove in place. Vectors are reconstructed from the index, so no embedding calls are needed.
+    """
+    removed = set(int(i) for i in removed_ids)
+    ids = faiss.vector_to_array(index.id_map)
+    keep = np.array([i for i in ids if int(i) not in removed], dtype="int64")
+    vectors = np.vstack([index.reconstruct(int(i)) for i in keep]) if len(keep) else None
+    rebuilt = build_index(config, index.d)
+    if vectors is not None:
+        rebuilt.add_with_ids(vectors, keep)
+    return rebuilt
+
+
+def load_index_config(directory):
+    """Read the configuration saved next to an index; indexes built before it existed are flat."""
+    path = os.path.join(directory, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return index_config()
+    with open(path, encoding="utf-8") as f:
+        return index_config(**json.load(f))
+
+
+def save_index_config(directory, config):
+    with open(os.path.join(directory, INDEX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+
+def load_vector_store(directory, embeddings, mmap=True):
+    """
+    Open a saved vector store for querying: the index is memory-mapped and chunks are read lazily
+    from the SQLite docstore, so worker processes on one host share the page cache.
+    """
+    docstore_path = os.path.join(directory, DOCSTORE_FILE)
+    if not os.path.exists(docstore_path):
+        raise FileNotFoundError(
+            f"No {DOCSTORE_FILE} in {directory}; convert the index with scripts/convert_faiss_docstore.py"
+        )
+    config = load_index_config(directory)
+    if mmap and not FLAT_CODES_MMAP and config["type"] in ("flat", "hnsw"):
+        logger.warning(
+            "faiss %s cannot memory-map %s indexes; %s is read fully into this process's memory. "
+            "Install the faiss-cpu version from requirements.txt to share it between processes.",
+            faiss.__version__, config["type"], directory
+        )
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE), MMAP_FLAGS if mmap else 0)
+    apply_search_params(index, config)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SqliteDocstore(docstore_path),
+        index_to_docstore_id=SqliteIndexMapping(docstore_path)
+    )
+
+
+def load_vector_store_for_update(directory, embeddings):
+    """Load a saved vector store fully into memory so chunks can be added and removed."""
+    chunks, index_to_docstore_id = read_docstore(os.path.join(directory, DOCSTORE_FILE))
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(chunks),
+        index_to_docstore_id=index_to_docstore_id
+    )
+
+
+def save_vector_store(vector_store, directory):
+    """Write the index and the SQLite docstore, replacing any previous version atomically."""
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, INDEX_FILE)
+    faiss.write_index(vector_store.index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    write_docstore(
+        os.path.join(directory, DOCSTORE_FILE), vector_store.docstore._dict, vector_store.index_to_docstore_id
+    )
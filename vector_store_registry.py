@@ -0,0 +1,156 @@
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+from langchain_openai import OpenAIEmbeddings
+
+from tracing import span
+from vector_index import INDEX_FILE, load_index_config, load_vector_store
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+
+def discover_indexes(root):
+    """Find saved indexes laid out as <root>/<year>/<language>/index.faiss. Returns {(year, language): path}."""
+    indexes = {}
+    if not os.path.isdir(root):
+        return indexes
+    for year in sorted(os.listdir(root)):
+        year_path = os.path.join(root, year)
+        if not os.path.isdir(year_path):
+            continue
+        for language in sorted(os.listdir(year_path)):
+            path = os.path.join(year_path, language)
+            if os.path.isfile(os.path.join(path, INDEX_FILE)):
+                indexes[(year, language)] = path
+    return indexes
+
+
+def index_size(path):
+    """Bytes an index can occupy in memory, estimated from its file size."""
+    return os.path.getsize(os.path.join(path, INDEX_FILE))
+
+
+def index_version(path):
+    """Identifies the index file on disk (modification time and size), so a rebuild gives a new version."""
+    stat = os.stat(os.path.join(path, INDEX_FILE))
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class VectorStoreRegistry:
+    """
+    Opens per-year, per-language vector stores on first use and keeps the most recently used ones
+    open, closing the least recently used once their combined size exceeds max_bytes.
+    The store in use is never closed, so a single index larger than the ceiling still loads.
+    An open store whose index file has been rebuilt since it was loaded is reopened.
+    """
+
+    def __init__(self, root, embeddings_for, max_bytes=None, mmap=True):
+        self.root = root
+        self.embeddings_for = embeddings_for
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def available(self):
+        """Indexes present on disk, rescanned on every call so new years show up without a restart."""
+        return discover_indexes(self.root)
+
+    def get(self, year, language):
+        """Return the vector store for a year and language, or None if no index exists for it."""
+        return self.get_with_version(year, language)[0]
+
+    def get_with_version(self, year, language):
+        """
+        Return (vector store, version of the index it was loaded from) for a year and language,
+        or (None, None) if no index exists for it. Results store the version to tell whether
+        the index they were retrieved from has been rebuilt since.
+        """
+        key = (str(year), language)
+        with self._lock:
+            entry = self._stores.get(key)
+            if entry is not None:
+                try:
+                    current = index_version(entry["path"])
+                except FileNotFoundError:
+                    current = None
+                if current == entry["version"]:
+                    self._stores.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry["store"], entry["version"]
+                del self._stores[key]
+
+            path = self.available().get(key)
+            if path is None:
+                return None, None
+            self._stats["misses"] += 1
+            # Taken before loading, so a rebuild that finishes during the load is picked up by the next call
+            version = index_version(path)
+            with span("vector_store.load"):
+                config = load_index_config(path)
+                store = load_vector_store(path, self.embeddings_for(config), mmap=self.mmap)
+            self._stores[key] = {"store": store, "bytes": index_size(path), "path": path, "version": version}
+            self._evict(keep=key)
+            return store, version
+
+    def prewarm(self, keys):
+        """Open the listed (year, language) indexes ahead of the first request."""
+        for year, language in keys:
+            self.get(year, language)
+
+    def _evict(self, keep):
+        while self.max_bytes and self.resident_bytes() > self.max_bytes and len(self._stores) > 1:
+            key = next(iter(self._stores))
+            if key == keep:
+                self._stores.move_to_end(key)
+                continue
+            del self._stores[key]
+            self._stats["evictions"] += 1
+
+    def resident_bytes(self):
+        return sum(entry["bytes"] for entry in self._stores.values())
+
+    def stats(self):
+        """Hit/miss/eviction counters and the currently open indexes, least recently used first."""
+        with self._lock:
+            return {
+                **self._stats,
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "open": [
+                    {"year": year, "language": language, "bytes": entry["bytes"]}
+                    for (year, language), entry in self._stores.items()
+                ],
+            }
+
+
+def _parse_prewarm(entries):
+    """Turn prewarm entries like "2024/English" into (year, language) keys."""
+    return [tuple(entry.strip("/").split("/", 1)) for entry in entries]
+
+
+@st.cache_resource
+def get_vector_store_registry():
+    """
+    Return the process-wide vector store registry.
+    Configured under [vector_store] in secrets.toml: root, max_memory_mb, mmap and prewarm (e.g. ["2024/English"]).
+    """
+    config = st.secrets.get("vector_store", {})
+    api_key = st.secrets["openai"]["OPENAI_API_KEY"]
+
+    def embeddings_for(index_config):
+        # Indexes built with shortened vectors need queries embedded at the same size
+        return OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=index_config["dimensions"], openai_api_key=api_key)
+
+    max_memory_mb = config.get("max_memory_mb")
+    registry = VectorStoreRegistry(
+        config.get("root", os.path.join("pages", "faiss_indexes")),
+        embeddings_for,
+        max_bytes=int(max_memory_mb) * 1024 * 1024 if max_memory_mb else None,
+        mmap=bool(config.get("mmap", True)),
+    )
+    registry.prewarm(_parse_prewarm(config.get("prewarm", [])))
+    return registry